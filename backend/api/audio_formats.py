@@ -0,0 +1,115 @@
+from typing import AsyncIterator, Dict, Iterator, Optional, Union
+
+from fastapi import HTTPException
+from starlette.concurrency import iterate_in_threadpool
+
+from .state import get_state
+
+# --- Audio Output Format Configuration ---
+AUDIO_STATS_TTL_SECONDS = 7 * 24 * 3600
+
+
+class AudioFormat:
+    """An output format clients can ask for, produced natively by ElevenLabs as elevenlabs_format.
+
+    concatenable formats can be streamed chunk by chunk.
+    """
+
+    def __init__(self, name: str, media_type: str, bytes_per_second: int, elevenlabs_format: str, concatenable: bool = True):
+        self.name = name
+        self.media_type = media_type
+        self.bytes_per_second = bytes_per_second
+        self.elevenlabs_format = elevenlabs_format
+        self.concatenable = concatenable
+
+
+AUDIO_FORMATS: Dict[str, AudioFormat] = {audio_format.name: audio_format for audio_format in [
+    AudioFormat("mp3_128", "audio/mpeg", 16000, "mp3_44100_128"),
+    AudioFormat("mp3_64", "audio/mpeg", 8000, "mp3_44100_64"),
+    # Plenty for speech and a quarter of the default size; meant for mobile connections and short UI lines
+    AudioFormat("mp3_32", "audio/mpeg", 4000, "mp3_22050_32"),
+    # Raw 16-bit mono samples for Web Audio playback without a decode step
+    AudioFormat("pcm_24000", "audio/L16;rate=24000;channels=1", 48000, "pcm_24000"),
+    # Ogg pages don't concatenate into one playable stream, so opus is always sent whole
+    AudioFormat("opus_32", 'audio/ogg; codecs="opus"', 4000, "opus_48000_32", concatenable=False),
+    AudioFormat("opus_64", 'audio/ogg; codecs="opus"', 8000, "opus_48000_64", concatenable=False),
+]}
+# What every endpoint returned before negotiation existed
+DEFAULT_AUDIO_FORMAT = AUDIO_FORMATS["mp3_128"]
+
+# Accept header media types (most preferred format first)
+ACCEPT_MEDIA_TYPES = {
+    "audio/mpeg": "mp3_128",
+    "audio/mp3": "mp3_128",
+    "audio/ogg": "opus_32",
+    "audio/opus": "opus_32",
+    "audio/l16": "pcm_24000",
+    "audio/pcm": "pcm_24000",
+}
+
+
+def negotiate_audio_format(requested: Optional[str], accept: Optional[str]) -> AudioFormat:
+    """Picks the output format from the request's output_format field, else its Accept header."""
+    if requested:
+        audio_format = AUDIO_FORMATS.get(requested)
+        if audio_format is None:
+            raise HTTPException(status_code=400, detail=f"Unsupported output_format '{requested}'. Supported: {', '.join(AUDIO_FORMATS)}.")
+        return audio_format
+
+    preferences = []
+    for position, item in enumerate((accept or "").split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    pass
+        preferences.append((-quality, position, media_type.lower()))
+    for negative_quality, _, media_type in sorted(preferences):
+        if negative_quality == 0:
+            break
+        if media_type in ("audio/*", "*/*"):
+            return DEFAULT_AUDIO_FORMAT
+        audio_format = AUDIO_FORMATS.get(ACCEPT_MEDIA_TYPES.get(media_type, ""))
+        if audio_format is not None:
+            return audio_format
+    return DEFAULT_AUDIO_FORMAT
+
+
+async def record_audio_output(audio_format: AudioFormat, size: int):
+    """Counts bytes sent per format against what the default MP3 would have been (estimated from the audio's duration)."""
+    baseline_size = int(size / audio_format.bytes_per_second * DEFAULT_AUDIO_FORMAT.bytes_per_second)
+    prefix = f"audio_format:{audio_format.name}"
+    state = get_state()
+    try:
+        await state.incr(f"{prefix}:responses", ttl=AUDIO_STATS_TTL_SECONDS)
+        await state.incr(f"{prefix}:bytes", size, ttl=AUDIO_STATS_TTL_SECONDS)
+        await state.incr(f"{prefix}:baseline_bytes", baseline_size, ttl=AUDIO_STATS_TTL_SECONDS)
+    except Exception as e:
+        print(f"[AUDIO_FORMATS] Failed to record output stats: {e}")
+
+
+async def metered_audio_stream(chunks: Union[Iterator[bytes], AsyncIterator[bytes]], audio_format: AudioFormat) -> AsyncIterator[bytes]:
+    """Passes a streamed response body through and records its size once it has been sent."""
+    if not hasattr(chunks, "__aiter__"):
+        chunks = iterate_in_threadpool(chunks)  # The ElevenLabs SDK yields from blocking HTTP reads
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        yield chunk
+    await record_audio_output(audio_format, size)
+
+
+async def audio_format_stats() -> Dict[str, Dict[str, int]]:
+    state = get_state()
+    stats = {}
+    for name in AUDIO_FORMATS:
+        counters = {}
+        for counter in ("responses", "bytes", "baseline_bytes"):
+            counters[counter] = int(await state.get(f"audio_format:{name}:{counter}") or 0)
+        # Negative for formats bigger than the default MP3 (pcm trades size for decode latency)
+        counters["bytes_saved"] = counters["baseline_bytes"] - counters["bytes"]
+        stats[name] = counters
+    return stats
@@ -0,0 +1,118 @@
+import asyncio
+import base64
+import hashlib
+import re
+from typing import AsyncIterator, Awaitable, Callable, List
+
+from .state import get_state
+
+# Sentence ends: Western and CJK terminal punctuation, optionally followed by closing quotes/brackets
+SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[.!?。！？…~])["\'”’)\]]*\s+')
+
+# Synthesizes one chunk of text into MP3 bytes
+ChunkSynthesizeFn = Callable[[str], Awaitable[bytes]]
+
+
+def split_sentences(text: str, min_chars: int = 15, max_chars: int = 300) -> List[str]:
+    """Splits narrator text at sentence boundaries.
+
+    Fragments shorter than min_chars (e.g. "네." or "좋아요!") are merged into the next sentence,
+    since a separate request for them costs more latency than it saves and sounds choppy.
+    """
+    sentences = [part.strip() for part in SENTENCE_BOUNDARY_RE.split(text.strip()) if part.strip()]
+    chunks: List[str] = []
+    pending = ""
+    for sentence in sentences:
+        candidate = f"{pending} {sentence}".strip() if pending else sentence
+        if len(candidate) < min_chars:
+            pending = candidate
+            continue
+        if pending and len(candidate) > max_chars:
+            chunks.append(pending)
+            candidate = sentence
+        chunks.append(candidate)
+        pending = ""
+    if pending:
+        if chunks and len(chunks[-1]) + len(pending) < max_chars:
+            chunks[-1] = f"{chunks[-1]} {pending}"
+        else:
+            chunks.append(pending)
+    return chunks
+
+
+def chunk_cache_key(text: str, voice_id: str, model_id: str, settings_key: str) -> str:
+    digest = hashlib.sha256(f"{voice_id}\0{model_id}\0{settings_key}\0{text}".encode("utf-8")).hexdigest()[:32]
+    return f"tts_chunk:{digest}"
+
+
+async def _cached_synthesis(text: str, cache_key: str, synthesize: ChunkSynthesizeFn, cache_ttl: int) -> bytes:
+    state = get_state()
+    cached = await state.get(cache_key)
+    if cached:
+        return base64.b64decode(cached)
+    audio = await synthesize(text)
+    try:
+        await state.set(cache_key, base64.b64encode(audio).decode("ascii"), ttl=cache_ttl)
+    except Exception as e:
+        print(f"[CHUNKED_TTS] Failed to cache chunk '{text[:20]}...': {e}")
+    return audio
+
+
+async def _synthesize_in_order(
+    chunks: List[str], cache_keys: List[str], synthesize: ChunkSynthesizeFn, max_concurrency: int, cache_ttl: int
+) -> AsyncIterator[bytes]:
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(text: str, cache_key: str) -> bytes:
+        # Tasks are created in order and the semaphore is FIFO, so the head chunk is always first in line
+        async with semaphore:
+            return await _cached_synthesis(text, cache_key, synthesize, cache_ttl)
+
+    tasks = [asyncio.create_task(run(text, key)) for text, key in zip(chunks, cache_keys)]
+    try:
+        for index, task in enumerate(tasks):
+            try:
+                yield await task
+            except Exception as e:
+                if index == 0:
+                    raise
+                # Headers are already sent; end the audio early rather than emit a broken stream
+                print(f"[CHUNKED_TTS] Chunk {index + 1}/{len(tasks)} failed, truncating stream: {e}")
+                return
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def chunked_speech_stream(
+    chunks: List[str],
+    voice_id: str,
+    model_id: str,
+    settings_key: str,
+    synthesize: ChunkSynthesizeFn,
+    max_concurrency: int,
+    cache_ttl: int,
+) -> AsyncIterator[bytes]:
+    """Synthesizes chunks concurrently and returns a generator yielding their MP3 bytes in order.
+
+    Waits for the head chunk before returning, so a failure there still surfaces as a normal error
+    response instead of a truncated 200. MP3 frames are self-delimiting, so the chunks concatenate
+    into one playable stream.
+    """
+    cache_keys = [chunk_cache_key(text, voice_id, model_id, settings_key) for text in chunks]
+    stream = _synthesize_in_order(chunks, cache_keys, synthesize, max_concurrency, cache_ttl)
+    try:
+        head = await stream.__anext__()
+    except BaseException:
+        await stream.aclose()
+        raise
+
+    async def body():
+        try:
+            yield head
+            async for audio in stream:
+                yield audio
+        finally:
+            await stream.aclose()
+
+    return body()
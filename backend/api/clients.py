@@ -0,0 +1,81 @@
+import os
+import time
+import threading
+from typing import Optional, Dict, Any
+
+# Vendor SDKs (boto3/botocore, elevenlabs) are imported inside the getters below so that a
+# cold start only pays for the clients the current request actually needs.
+
+_s3_client: Optional[Any] = None
+_s3_client_attempted = False
+_s3_client_lock = threading.Lock()
+
+_elevenlabs_client: Optional[Any] = None
+_elevenlabs_client_attempted = False
+_elevenlabs_client_lock = threading.Lock()
+
+
+# --- AWS S3 Client Initialization ---
+def get_s3_client():
+    """Returns the shared boto3 S3 client, constructing it on first use (None if not configured)."""
+    global _s3_client, _s3_client_attempted
+    if _s3_client_attempted:
+        return _s3_client
+    with _s3_client_lock:
+        if _s3_client_attempted:
+            return _s3_client
+        aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
+        aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
+        aws_region = os.getenv("AWS_REGION")
+        if all([os.getenv("S3_BUCKET_NAME"), aws_access_key_id, aws_secret_access_key, aws_region]):
+            try:
+                import boto3
+                _s3_client = boto3.client(
+                    's3',
+                    aws_access_key_id=aws_access_key_id,
+                    aws_secret_access_key=aws_secret_access_key,
+                    region_name=aws_region
+                )
+                print("S3 client initialized successfully.")
+            except Exception as e:
+                print(f"Error initializing S3 client: {e}. S3 dependent features will not work.")
+        else:
+            print("S3 client not initialized due to missing AWS credentials in .env.")
+        _s3_client_attempted = True
+    return _s3_client
+
+
+# --- ElevenLabs Client Initialization ---
+def get_elevenlabs_client():
+    """Returns the shared ElevenLabs client, constructing it on first use (None if not configured)."""
+    global _elevenlabs_client, _elevenlabs_client_attempted
+    if _elevenlabs_client_attempted:
+        return _elevenlabs_client
+    with _elevenlabs_client_lock:
+        if _elevenlabs_client_attempted:
+            return _elevenlabs_client
+        api_key = os.getenv("ELEVEN_LABS_API_KEY")
+        if api_key:
+            try:
+                from elevenlabs.client import ElevenLabs
+                _elevenlabs_client = ElevenLabs(api_key=api_key)
+                print("ElevenLabs client initialized successfully.")
+            except Exception as e:
+                print(f"Error initializing ElevenLabs client: {e}")
+        else:
+            print("ElevenLabs client not initialized due to missing API key.")
+        _elevenlabs_client_attempted = True
+    return _elevenlabs_client
+
+
+def warm_up_clients() -> Dict[str, Dict[str, Any]]:
+    """Initializes every vendor client now and reports how long each one took."""
+    report: Dict[str, Dict[str, Any]] = {}
+    for name, getter in (("s3", get_s3_client), ("elevenlabs", get_elevenlabs_client)):
+        start = time.perf_counter()
+        client = getter()
+        report[name] = {
+            "initialized": client is not None,
+            "ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+    return report
@@ -0,0 +1,121 @@
+import asyncio
+import contextvars
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+from fastapi import HTTPException
+
+from .middleware import STAGE_DESCRIPTIONS
+from .state import get_state
+
+# --- Request Deadline Configuration ---
+# Vercel kills the function at maxDuration (60s) without a response; the budget ends early enough
+# that the handler can still answer with a 504 or a background job handle.
+REQUEST_BUDGET_SECONDS = float(os.getenv("REQUEST_BUDGET_SECONDS", "50"))
+DEADLINE_RESERVE_SECONDS = float(os.getenv("DEADLINE_RESERVE_SECONDS", "2"))  # Kept back for building the response
+MIN_STAGE_TIMEOUT_SECONDS = 1.0  # Not worth starting an upstream call with less than this left
+
+BUDGET_HEADER = b"x-request-budget"  # Lets a client ask for a shorter (never longer) budget, in seconds
+DEADLINE_MISS_TTL_SECONDS = 7 * 24 * 3600
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() deadline of the current request (None outside a request / when detached)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(HTTPException):
+    """Raised when the request budget runs out during `stage`; FastAPI turns it into a 504."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        super().__init__(status_code=504, detail=f"Request time budget exhausted during {STAGE_DESCRIPTIONS.get(stage, stage)}. Please try again.")
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left for upstream work in this request (response reserve excluded), or None if unbounded."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic() - DEADLINE_RESERVE_SECONDS
+
+
+def detach_deadline():
+    """Unbinds the current task from the request deadline, e.g. for work continuing in the background.
+
+    Only affects the calling task's context, so the request itself keeps its deadline.
+    """
+    _deadline.set(None)
+
+
+async def record_deadline_miss(stage: str):
+    print(f"[DEADLINE] Request budget exhausted during '{stage}'")
+    try:
+        await get_state().incr(f"deadline_misses:{stage}", ttl=DEADLINE_MISS_TTL_SECONDS)
+    except Exception as e:
+        print(f"[DEADLINE] Failed to count deadline miss for '{stage}': {e}")
+
+
+async def deadline_miss_counts() -> Dict[str, int]:
+    state = get_state()
+    counts = {}
+    for stage in STAGE_DESCRIPTIONS:
+        counts[stage] = int(await state.get(f"deadline_misses:{stage}") or 0)
+    return counts
+
+
+async def stage_timeout(stage: str, cap: float) -> float:
+    """Timeout for one upstream call: its own cap, shortened to what is left of the request budget."""
+    remaining = remaining_budget()
+    if remaining is None:
+        return cap
+    if remaining < MIN_STAGE_TIMEOUT_SECONDS:
+        await record_deadline_miss(stage)
+        raise DeadlineExceeded(stage)
+    return min(cap, remaining)
+
+
+async def call_with_budget(stage: str, cap: float, call: Callable[[float], Awaitable[T]]) -> T:
+    """Runs call(timeout) with the remaining budget as its timeout.
+
+    Raises DeadlineExceeded when the budget (rather than the call's own cap) cut it short;
+    ordinary timeouts propagate unchanged.
+    """
+    timeout = await stage_timeout(stage, cap)
+    try:
+        return await asyncio.wait_for(call(timeout), timeout)
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        if timeout < cap:
+            await record_deadline_miss(stage)
+            raise DeadlineExceeded(stage)
+        raise
+
+
+class DeadlineMiddleware:
+    """Starts the time budget of each HTTP request."""
+
+    def __init__(self, app, budget_seconds: float = REQUEST_BUDGET_SECONDS):
+        self.app = app
+        self.budget_seconds = budget_seconds
+
+    def budget_for(self, scope) -> float:
+        requested = dict(scope["headers"]).get(BUDGET_HEADER)
+        if requested is not None:
+            try:
+                return max(0.0, min(self.budget_seconds, float(requested)))
+            except ValueError:
+                pass
+        return self.budget_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.budget_seconds <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        token = _deadline.set(time.monotonic() + self.budget_for(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
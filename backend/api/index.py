@@ -1,27 +1,49 @@
 import os
+import asyncio
 import httpx
 import uuid
+import time
+import hmac
+import hashlib
+import functools
 import json # For debugging payloads
-from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request, Response, Form
-from fastapi.responses import StreamingResponse, JSONResponse, RedirectResponse
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from dotenv import load_dotenv
-import boto3
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
-from typing import Optional, Dict
+from fastapi import FastAPI, UploadFile, HTTPException, Query, Request, Response, Depends
+from fastapi.responses import StreamingResponse, JSONResponse, RedirectResponse, FileResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, ValidationError
+from typing import Optional, Dict, List
 import sys
 import traceback
 from .face_configs import FACE_CONFIGS
+from .voice_scenarios import VOICE_SCENARIO_SCRIPTS
+from .state import get_state, check_rate_limit
+from .clients import get_s3_client, get_elevenlabs_client, warm_up_clients
+from .speech_prefetch import SpeechPrefetchStore
+from .result_archive import archive_url_to_s3, archived_object_name, public_object_url, ARCHIVE_CACHE_CONTROL
+from .video_postprocess import postprocess_video_to_s3, postprocess_enabled
+from .chunked_tts import split_sentences, chunked_speech_stream
+from .middleware import ServerTimingMiddleware, CORSMiddleware, ErrorHandlingMiddleware, stage_timer
+from .deadline import (
+    DeadlineMiddleware, DeadlineExceeded, REQUEST_BUDGET_SECONDS,
+    call_with_budget, remaining_budget, detach_deadline, record_deadline_miss, deadline_miss_counts
+)
+from .audio_formats import (
+    AudioFormat, DEFAULT_AUDIO_FORMAT, negotiate_audio_format,
+    record_audio_output, metered_audio_stream, audio_format_stats
+)
+from .upload_ingest import upload_ingestion, IngestedForm, IMAGE_UPLOAD_POLICY, AUDIO_UPLOAD_POLICY, ingest_stats
+from .traffic_capture import TrafficCaptureMiddleware, TRAFFIC_CAPTURE_ENABLED, TRAFFIC_CAPTURE_PATH
+from .profiling import ProfilingMiddleware, PROFILING_ENABLED, PROFILE_SAMPLE_RATE, list_profiles, profile_path
 import io
 import urllib.parse
+import anyio
 
-# ElevenLabs SDK
-from elevenlabs.client import ElevenLabs
-from elevenlabs import VoiceSettings, Voice
-
-# Load environment variables from the root directory
-load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
+# Load environment variables from the root directory. Deployed functions get their
+# variables from the platform, so only import python-dotenv when a .env file exists.
+_dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+if os.path.exists(_dotenv_path):
+    from dotenv import load_dotenv
+    load_dotenv(_dotenv_path)
 
 # --- Environment Variable Loading and Validation ---
 ELEVEN_LABS_API_KEY = os.getenv("ELEVEN_LABS_API_KEY")
@@ -39,6 +61,32 @@ AWS_REGION = os.getenv("AWS_REGION")
 
 AKOOL_WEBHOOK_URL = os.getenv("AKOOL_WEBHOOK_URL") # Optional
 
+# Sent as X-Admin-Token to the /api/admin/* endpoints; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Per-client request limits (per minute, shared across workers via the state backend; 0 disables)
+RATE_LIMIT_FACESWAP_PER_MINUTE = int(os.getenv("RATE_LIMIT_FACESWAP_PER_MINUTE", "10"))
+RATE_LIMIT_VOICE_CLONE_PER_MINUTE = int(os.getenv("RATE_LIMIT_VOICE_CLONE_PER_MINUTE", "5"))
+RATE_LIMIT_SPEECH_PREFETCH_PER_MINUTE = int(os.getenv("RATE_LIMIT_SPEECH_PREFETCH_PER_MINUTE", "5"))
+AKOOL_TASK_TTL_SECONDS = int(os.getenv("AKOOL_TASK_TTL_SECONDS", str(24 * 3600)))
+# How long an identical (same photo + same target) faceswap submission reuses the earlier task
+FACESWAP_DEDUP_TTL_SECONDS = int(os.getenv("FACESWAP_DEDUP_TTL_SECONDS", str(6 * 3600)))
+# Upper bound on Akool jobs submitted in parallel by a single batch request
+MAX_CONCURRENT_AKOOL_SUBMISSIONS = int(os.getenv("MAX_CONCURRENT_AKOOL_SUBMISSIONS", "4"))
+# Speculative speech synthesis started when the user submits their profile
+SPEECH_PREFETCH_MAX_CONCURRENCY = int(os.getenv("SPEECH_PREFETCH_MAX_CONCURRENCY", "3"))
+SPEECH_PREFETCH_TTL_SECONDS = int(os.getenv("SPEECH_PREFETCH_TTL_SECONDS", "900"))
+SPEECH_PREFETCH_MAX_SCRIPTS = int(os.getenv("SPEECH_PREFETCH_MAX_SCRIPTS", "10"))  # Per request; each is a paid render
+# Copy finished Akool results into our bucket so their URLs never expire
+RESULT_ARCHIVE_ENABLED = os.getenv("RESULT_ARCHIVE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Sentence-chunked narrator synthesis (NarratorSpeechRequest.chunked)
+NARRATOR_CHUNK_CONCURRENCY = int(os.getenv("NARRATOR_CHUNK_CONCURRENCY", "3"))
+NARRATOR_CHUNK_CACHE_TTL_SECONDS = int(os.getenv("NARRATOR_CHUNK_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Upper bounds for single upstream calls; each is further capped by the request budget (deadline.py)
+S3_UPLOAD_TIMEOUT_SECONDS = 30.0
+AKOOL_DETECT_TIMEOUT_SECONDS = 30.0
+AKOOL_STATUS_TIMEOUT_SECONDS = 30.0
+
 # Validate essential configurations
 if not ELEVEN_LABS_API_KEY:
     print("CRITICAL ERROR: ELEVEN_LABS_API_KEY not set in .env")
@@ -62,60 +110,28 @@ CORS_ORIGINS = [
     "https://ai-awareness-frontend.vercel.app",
     "http://localhost:3000",
     "https://ai-awareness-frontend-10dpc500r-hanaisreals-projects.vercel.app",
-    "https://*.vercel.app",  # Allow all Vercel preview deployments
+    # This project's Vercel preview deployments only (<project>-<hash|git-branch>-<team>.vercel.app);
+    # a bare *.vercel.app would let any Vercel-hosted site make credentialed requests
+    "https://ai-awareness-frontend-*-hanaisreals-projects.vercel.app",
     "http://localhost:8000",  # Allow local backend
     "https://ai-awarenesss-backend.vercel.app"  # Add your backend Vercel URL
 ]
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Pure ASGI middleware (see middleware.py). The last one added runs first, so the order is
+# Server-Timing -> CORS (answers preflights directly) -> [traffic capture] -> error handling -> [profiler]
+# -> deadline -> routes.
+app.add_middleware(DeadlineMiddleware)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(ErrorHandlingMiddleware)
+if TRAFFIC_CAPTURE_ENABLED:
+    app.add_middleware(TrafficCaptureMiddleware)
+app.add_middleware(CORSMiddleware, allow_origins=CORS_ORIGINS)
+app.add_middleware(ServerTimingMiddleware)
 
-# Add error handling middleware
-@app.middleware("http")
-async def catch_exceptions_middleware(request, call_next):
-    try:
-        return await call_next(request)
-    except Exception as e:
-        print(f"Unhandled error: {str(e)}")
-        print("Traceback:")
-        print(traceback.format_exc())
-        return JSONResponse(
-            status_code=500,
-            content={"detail": f"Internal server error: {str(e)}"}
-        )
-
-# --- AWS S3 Client Initialization ---
-s3_client = None
-if all([S3_BUCKET_NAME, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION]):
-    try:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION
-        )
-        print("S3 client initialized successfully.")
-    except Exception as e:
-        print(f"Error initializing S3 client: {e}. S3 dependent features will not work.")
-else:
-    print("S3 client not initialized due to missing AWS credentials in .env.")
-
-
-# --- ElevenLabs Client Initialization ---
-elevenlabs_client = None
-if ELEVEN_LABS_API_KEY:
-    try:
-        elevenlabs_client = ElevenLabs(api_key=ELEVEN_LABS_API_KEY)
-        print("ElevenLabs client initialized successfully.")
-    except Exception as e:
-        print(f"Error initializing ElevenLabs client: {e}")
-else:
-    print("ElevenLabs client not initialized due to missing API key.")
+# --- Vendor Clients ---
+# The S3 and ElevenLabs clients are created lazily on first use (see clients.py),
+# so cold starts that never touch them (e.g. /api/stream-image) don't pay for them.
 
 
 # --- Pydantic Models ---
@@ -123,37 +139,72 @@ class NarratorSpeechRequest(BaseModel):
     text: str
     voice_id: str # Voice ID will now be sent from frontend
     model_id: str = "eleven_multilingual_v2"
+    chunked: bool = False # Synthesize sentence by sentence in parallel and stream as soon as the first is ready
+    output_format: Optional[str] = None # See audio_formats.AUDIO_FORMATS; defaults to the Accept header, then mp3_128
     # Optional: add stability and similarity_boost if you want to control them for narrator
     # stability: Optional[float] = 0.7
     # similarity_boost: Optional[float] = 0.7
 
+class FaceswapTarget(BaseModel):
+    section: str # "FAKE_NEWS" or "IDENTITY_THEFT"
+    scenario: str # "SCENARIO1" or "SCENARIO2"
+    gender: str # "male" or "female"
+    mode: str = "image" # "image" (specifyimage) or "video" (specifyvideo)
+    face_enhance: int = 0
+
 class ElevenLabsSpeechRequest(BaseModel):
     text: Optional[str] = None
     name: Optional[str] = None
     age: Optional[str] = None # Age is not used in speech text but good to have if needed later
     voice_id: Optional[str] = "uyVNoMrnUku1dZyVEXwD" # Default to a standard voice
     model_id: Optional[str] = "eleven_multilingual_v2"
+    session_id: Optional[str] = None # Set to pick up audio prefetched via /api/prefetch-speech
+    output_format: Optional[str] = None # See audio_formats.AUDIO_FORMATS; defaults to the Accept header, then mp3_128
+
+class SpeechPrefetchScript(BaseModel):
+    script_id: str
+    text: str # May contain {name} / {age} placeholders, filled from the user profile
+
+class SpeechPrefetchRequest(BaseModel):
+    session_id: Optional[str] = None # Generated if omitted
+    name: Optional[str] = None
+    age: Optional[str] = None
+    voice_id: Optional[str] = "uyVNoMrnUku1dZyVEXwD"
+    model_id: Optional[str] = "eleven_multilingual_v2"
+    scripts: List[SpeechPrefetchScript]
 
 
 # --- Helper Functions ---
 async def upload_to_s3(file: UploadFile, bucket_name: str, object_name: Optional[str] = None) -> str:
+    from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
+
+    s3_client = get_s3_client()
     if not s3_client:
         raise HTTPException(status_code=500, detail="S3 client not initialized. Check server logs and .env configuration.")
     if object_name is None:
         file_extension = file.filename.split('.')[-1] if '.' in file.filename else 'png' # Default extension
         object_name = f"user_uploads/{uuid.uuid4()}.{file_extension}"
 
+    upload = functools.partial(
+        s3_client.upload_fileobj,
+        file.file,
+        bucket_name,
+        object_name,
+        ExtraArgs={'ACL': 'public-read', 'ContentType': file.content_type}
+    )
     try:
-        s3_client.upload_fileobj(
-            file.file, 
-            bucket_name, 
-            object_name, 
-            ExtraArgs={'ACL': 'public-read', 'ContentType': file.content_type}
-        )
+        with stage_timer("upload"):
+            # boto3 blocks, so upload on a worker thread; on a deadline miss the request stops waiting for it
+            await call_with_budget(
+                "upload", S3_UPLOAD_TIMEOUT_SECONDS,
+                lambda timeout: anyio.to_thread.run_sync(upload, abandon_on_cancel=True)
+            )
         # Construct the public URL
         public_url = f"https://{bucket_name}.s3.{AWS_REGION}.amazonaws.com/{object_name}"
         print(f"File uploaded to S3: {public_url}")
         return public_url
+    except HTTPException:
+        raise
     except NoCredentialsError:
         print("S3 Upload Error: AWS credentials not found.")
         raise HTTPException(status_code=500, detail="S3 configuration error: Credentials not found.")
@@ -185,9 +236,13 @@ async def get_akool_face_opts(image_url: str, api_key: str) -> Optional[str]:
         "single_face": True,
         "image_url": image_url
     }
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    async with httpx.AsyncClient() as client:
         try:
-            response = await client.post(detect_url, headers=headers, json=payload)
+            with stage_timer("detect"):
+                response = await call_with_budget(
+                    "detect", AKOOL_DETECT_TIMEOUT_SECONDS,
+                    lambda timeout: client.post(detect_url, headers=headers, json=payload, timeout=timeout)
+                )
             response.raise_for_status()
             data = response.json()
             if data.get("error_code") == 0 and "landmarks_str" in data:
@@ -202,6 +257,8 @@ async def get_akool_face_opts(image_url: str, api_key: str) -> Optional[str]:
             else:
                 print(f"Akool /detect API error: Code {data.get('error_code')} - {data.get('error_msg', 'Unknown error')}")
                 return None
+        except DeadlineExceeded:
+            raise
         except httpx.HTTPStatusError as e:
             print(f"Akool /detect HTTP error: {e.response.status_code} - {e.response.text}")
             return None
@@ -210,6 +267,472 @@ async def get_akool_face_opts(image_url: str, api_key: str) -> Optional[str]:
             return None
 
 
+def get_client_ip(request: Request) -> str:
+    # Vercel and most proxies put the original client first in X-Forwarded-For
+    forwarded_for = request.headers.get("x-forwarded-for")
+    if forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def enforce_rate_limit(request: Request, action: str, limit_per_minute: int):
+    client_ip = get_client_ip(request)
+    if not await check_rate_limit(f"{action}:{client_ip}", limit_per_minute, 60):
+        print(f"Rate limit exceeded for {action} by {client_ip}")
+        raise HTTPException(status_code=429, detail="Too many requests. Please wait a moment and try again.")
+
+
+# Akool faceswap_status values as handled by the frontend: 0 = queued, 1 = processing, 2 = success, 3 = failed
+AKOOL_STATUS_SUCCESS = 2
+AKOOL_STATUS_FAILED = 3
+AKOOL_TERMINAL_STATUSES = (2, 3)
+
+# Keeps fire-and-forget tasks referenced until they finish (asyncio only holds weak references)
+_background_tasks = set()
+
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def track_akool_task(task_id: Optional[str], **info):
+    """Records (or updates) an Akool task in shared state."""
+    if not task_id:
+        return
+    try:
+        state = get_state()
+        record = await state.get_json(f"akool_task:{task_id}") or {"task_id": task_id}
+        record.update(info)
+        await state.set_json(f"akool_task:{task_id}", record, ttl=AKOOL_TASK_TTL_SECONDS)
+    except Exception as e:
+        # Task tracking is best-effort; never fail the request because of it
+        print(f"Warning: Failed to record Akool task {task_id} in shared state: {e}")
+
+
+def akool_media_request_headers(url: str) -> Dict[str, str]:
+    """Headers for fetching Akool result media (CloudFront / Akool hosts need the API key)."""
+    headers = {"Accept": "*/*"}
+    lowered_url = url.lower()
+    if AKOOL_API_KEY and ("cloudfront.net" in lowered_url or "openapi.akool.com" in lowered_url or "sg3.akool.com" in lowered_url):
+        headers["Authorization"] = f"Bearer {AKOOL_API_KEY}"
+    return headers
+
+
+async def archive_akool_result(task_id: str) -> Optional[str]:
+    """Copies a finished Akool result into our bucket once and returns its stable URL.
+
+    Returns None if the task isn't finished, archiving is disabled, or another worker is already archiving it.
+    """
+    state = get_state()
+    tracked = await state.get_json(f"akool_task:{task_id}") or {}
+    if tracked.get("archived_url"):
+        return tracked["archived_url"]
+
+    result_url = (tracked.get("status_details") or {}).get("url")
+    if not RESULT_ARCHIVE_ENABLED or tracked.get("faceswap_status") != AKOOL_STATUS_SUCCESS or not result_url:
+        return None
+    if not S3_BUCKET_NAME or not get_s3_client():
+        return None
+
+    if not await state.set_if_absent(f"archive_lock:{task_id}", "1", ttl=300):
+        print(f"[RESULT_ARCHIVE] Task {task_id} is already being archived")
+        return None
+
+    try:
+        object_name = archived_object_name(task_id, result_url, tracked.get("kind", "image"))
+        archived = await archive_url_to_s3(
+            result_url, S3_BUCKET_NAME, AWS_REGION, object_name,
+            request_headers=akool_media_request_headers(result_url)
+        )
+        await track_akool_task(task_id, archived_url=archived["url"], archived_size=archived["size"])
+        return archived["url"]
+    except Exception as e:
+        print(f"[RESULT_ARCHIVE] Failed to archive result of task {task_id} from {result_url}: {e}")
+        return None
+    finally:
+        await state.delete(f"archive_lock:{task_id}")
+
+
+async def postprocess_akool_video(task_id: str) -> Optional[dict]:
+    """Produces the faststart remux, poster frame (and optional mobile rendition) for a finished video once."""
+    state = get_state()
+    tracked = await state.get_json(f"akool_task:{task_id}") or {}
+    if tracked.get("video_assets"):
+        return tracked["video_assets"]
+
+    source_url = tracked.get("archived_url") or (tracked.get("status_details") or {}).get("url")
+    if tracked.get("faceswap_status") != AKOOL_STATUS_SUCCESS or not source_url:
+        return None
+    if not postprocess_enabled() or not S3_BUCKET_NAME or not get_s3_client():
+        return None
+
+    if not await state.set_if_absent(f"postprocess_lock:{task_id}", "1", ttl=600):
+        print(f"[VIDEO_POSTPROCESS] Task {task_id} is already being post-processed")
+        return None
+
+    try:
+        video_assets = await postprocess_video_to_s3(
+            source_url, S3_BUCKET_NAME, AWS_REGION, f"faceswap_results/{task_id}",
+            request_headers=akool_media_request_headers(source_url)
+        )
+        await track_akool_task(task_id, video_assets=video_assets)
+        return video_assets
+    except Exception as e:
+        print(f"[VIDEO_POSTPROCESS] Failed to post-process video of task {task_id} from {source_url}: {e}")
+        return None
+    finally:
+        await state.delete(f"postprocess_lock:{task_id}")
+
+
+async def archive_and_postprocess(task_id: str):
+    await archive_akool_result(task_id)
+    await postprocess_akool_video(task_id)
+
+
+def stable_result_url(task_id: str, tracked: Optional[dict]) -> Optional[str]:
+    """Where clients should load a finished result from: the redirect to its archived copy.
+
+    Available from the first success response on; the redirect archives inline if the copy isn't done.
+    """
+    if not RESULT_ARCHIVE_ENABLED or not S3_BUCKET_NAME:
+        return None
+    if not tracked or tracked.get("faceswap_status") != AKOOL_STATUS_SUCCESS:
+        return None
+    return f"/api/faceswap-result/{task_id}"
+
+
+def schedule_result_archive(task_id: str, tracked: Optional[dict]):
+    if not tracked or tracked.get("faceswap_status") != AKOOL_STATUS_SUCCESS:
+        return
+    needs_archive = RESULT_ARCHIVE_ENABLED and not tracked.get("archived_url")
+    needs_postprocess = tracked.get("kind") == "video" and not tracked.get("video_assets") and postprocess_enabled()
+    if needs_archive and needs_postprocess:
+        # Post-process from our archived copy rather than downloading from Akool twice
+        run_in_background(archive_and_postprocess(task_id))
+    elif needs_archive:
+        run_in_background(archive_akool_result(task_id))
+    elif needs_postprocess:
+        run_in_background(postprocess_akool_video(task_id))
+
+
+# --- Upload Ingestion ---
+# Upload endpoints parse their multipart body through these dependencies (see upload_ingest.py)
+# instead of File()/Form() parameters, so limits apply while the body is still streaming in.
+ingest_image_upload = upload_ingestion(IMAGE_UPLOAD_POLICY)
+ingest_audio_upload = upload_ingestion(AUDIO_UPLOAD_POLICY)
+ingest_bundle_upload = upload_ingestion(IMAGE_UPLOAD_POLICY, AUDIO_UPLOAD_POLICY)
+
+
+# --- Faceswap Submission Dedup ---
+# A double-click, refresh or retry re-submits the same photo for the same target. Those requests get
+# the earlier Akool task (or its finished result) back instead of starting another paid job.
+FACESWAP_DEDUP_PENDING_TTL_SECONDS = 120 # Claim lifetime while the first request is still submitting
+
+
+def faceswap_dedup_key(image_hash: str, mode: str, swap_config: dict, face_enhance: int) -> str:
+    # Keyed on the resolved target config, so editing FACE_CONFIGS naturally invalidates old entries
+    target = json.dumps({"mode": mode, "config": swap_config, "face_enhance": face_enhance}, sort_keys=True)
+    return hashlib.sha256(f"{image_hash}:{target}".encode("utf-8")).hexdigest()
+
+
+async def claim_faceswap_dedup(dedup_key: str) -> Optional[dict]:
+    """Returns the tracked task of an identical earlier submission, or None once this request owns the key.
+
+    The caller must then either record_faceswap_dedup() or release_faceswap_dedup().
+    """
+    state = get_state()
+    key = f"faceswap_dedup:{dedup_key}"
+    for _ in range(20):
+        if await state.set_json_if_absent(key, {"pending": True}, ttl=FACESWAP_DEDUP_PENDING_TTL_SECONDS):
+            return None
+        entry = await state.get_json(key)
+        if entry and entry.get("task_id"):
+            tracked = await state.get_json(f"akool_task:{entry['task_id']}") or {"task_id": entry["task_id"]}
+            if tracked.get("faceswap_status") == AKOOL_STATUS_FAILED:
+                # Failed jobs can be retried for real
+                await state.delete(key)
+                continue
+            return tracked
+        # The identical request is still uploading/submitting; wait for its task ID
+        await asyncio.sleep(0.5)
+    raise HTTPException(status_code=409, detail="An identical faceswap request is already being submitted. Please wait for it to finish.")
+
+
+async def record_faceswap_dedup(dedup_key: str, task_id: Optional[str]):
+    if not task_id:
+        await release_faceswap_dedup(dedup_key)
+        return
+    await get_state().set_json(f"faceswap_dedup:{dedup_key}", {"task_id": task_id}, ttl=FACESWAP_DEDUP_TTL_SECONDS)
+
+
+async def release_faceswap_dedup(dedup_key: str):
+    try:
+        await get_state().delete(f"faceswap_dedup:{dedup_key}")
+    except Exception as e:
+        print(f"Warning: Failed to release faceswap dedup key {dedup_key}: {e}")
+
+
+def deduplicated_faceswap_response(tracked: dict) -> dict:
+    status_details = tracked.get("status_details") or {}
+    completed = tracked.get("faceswap_status") == AKOOL_STATUS_SUCCESS
+    print(f"Deduplicated faceswap submission -> existing task {tracked['task_id']} (completed: {completed})")
+    return {
+        "akool_task_id": tracked["task_id"],
+        "akool_job_id": tracked.get("job_id"),
+        "message": "Identical request already completed." if completed else "Identical request already in progress. Poll for status.",
+        "deduplicated": True,
+        "direct_url": (tracked.get("archived_url") or status_details.get("url")) if completed else None,
+        "status_details": status_details if completed else None
+    }
+
+
+# --- Akool Faceswap Helpers ---
+FACESWAP_MODES = {"image": "image_swap", "video": "video_swap"}
+
+
+def resolve_faceswap_target(section: str, scenario: str, gender: str, mode: str) -> dict:
+    """Returns the FACE_CONFIGS image_swap/video_swap entry for a target, or raises a 400."""
+    if mode not in FACESWAP_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode: {mode}. Expected 'image' or 'video'.")
+    if section not in FACE_CONFIGS:
+        raise HTTPException(status_code=400, detail=f"Invalid section: {section}")
+
+    scenario_config = FACE_CONFIGS[section].get(scenario)
+    if not scenario_config:
+        raise HTTPException(status_code=400, detail=f"Invalid scenario: {scenario}")
+
+    if gender not in scenario_config:
+        raise HTTPException(status_code=400, detail=f"Invalid gender: {gender}")
+
+    config_key = FACESWAP_MODES[mode]
+    swap_config = scenario_config[gender].get(config_key)
+    if not swap_config:
+        raise HTTPException(status_code=400, detail=f"No {config_key} configuration found for {section}/{scenario}/{gender}.")
+    if mode == "video" and (not swap_config.get("modifyVideoUrl") or not swap_config.get("targetFacesInVideo")):
+        raise HTTPException(status_code=400, detail="Incomplete video_swap configuration: modifyVideoUrl or targetFacesInVideo missing in FACE_CONFIGS.")
+    return swap_config
+
+
+async def submit_akool_faceswap(mode: str, source_image_url: str, source_landmarks: str, swap_config: dict, face_enhance: int = 0) -> dict:
+    """Submits one faceswap job to Akool and returns the parsed response (code 1000 guaranteed).
+
+    Raises httpx.HTTPStatusError for HTTP failures and HTTPException for Akool-level errors.
+    """
+    if mode == "image":
+        target_config = swap_config["targetImage"]
+        faceswap_url = f"{AKOOL_API_BASE_URL}/faceswap/highquality/specifyimage"
+        payload = {
+            "sourceImage": [{"path": source_image_url, "opts": source_landmarks}],
+            "targetImage": [{"path": target_config["path"], "opts": target_config["opts"]}],
+            "face_enhance": face_enhance,
+            "modifyImage": target_config["path"],
+            "webhookUrl": AKOOL_WEBHOOK_URL if AKOOL_WEBHOOK_URL else None
+        }
+        timeout = 30.0
+    else:
+        faceswap_url = f"{AKOOL_API_BASE_URL}/faceswap/highquality/specifyvideo"
+        payload = {
+            "sourceImage": [{"path": source_image_url, "opts": source_landmarks}],
+            # Akool's specifyvideo expects the FACE_CONFIGS targetFacesInVideo list as-is
+            "targetImage": swap_config["targetFacesInVideo"],
+            "face_enhance": face_enhance,
+            "modifyVideo": swap_config["modifyVideoUrl"],
+            "webhookUrl": AKOOL_WEBHOOK_URL if AKOOL_WEBHOOK_URL else None
+        }
+        timeout = 60.0
+
+    headers = {
+        "Authorization": f"Bearer {AKOOL_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    print(f"Akool {mode} Faceswap Request URL: {faceswap_url}")
+    print(f"Akool {mode} Faceswap Request Payload: {json.dumps(payload, indent=2)}")
+
+    async with httpx.AsyncClient() as client:
+        with stage_timer("vendor"):
+            response = await call_with_budget(
+                "vendor", timeout,
+                lambda budget_timeout: client.post(faceswap_url, headers=headers, json=payload, timeout=budget_timeout)
+            )
+        response_text = response.text
+        print(f"Akool {mode} Faceswap Raw Response Status: {response.status_code}")
+        print(f"Akool {mode} Faceswap Raw Response Body: {response_text}")
+        response.raise_for_status()
+
+        try:
+            data = response.json()
+        except json.JSONDecodeError:
+            error_msg = f"Failed to decode JSON response from Akool {mode} faceswap API."
+            print(f"{error_msg} Response text was: {response_text}")
+            raise HTTPException(status_code=502, detail=error_msg)
+
+    if data.get("code") != 1000:
+        error_msg = f"Akool {mode} faceswap API error. Code: {data.get('code')}. Message: {data.get('msg', 'No specific error message provided by Akool.')}"
+        print(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+    return data
+
+
+# --- Deadline Hand-off ---
+async def submit_faceswap_within_budget(
+    mode: str, source_image_url: str, source_landmarks: str, swap_config: dict, face_enhance: int,
+    dedup_key: Optional[str], **track_info
+) -> dict:
+    """Submits to Akool and tracks the task, waiting only as long as the request budget allows.
+
+    If the budget runs out first, the submission carries on as a background job and {"job_id": ...}
+    is returned instead (poll /api/faceswap-job/{job_id}). Takes over the dedup claim either way.
+    """
+    async def submit() -> dict:
+        # Runs in its own task, so this only lifts the deadline for the submission itself
+        detach_deadline()
+        try:
+            data = await submit_akool_faceswap(mode, source_image_url, source_landmarks, swap_config, face_enhance)
+        except BaseException:
+            if dedup_key:
+                await release_faceswap_dedup(dedup_key)
+            raise
+        task_id = data.get("data", {}).get("_id")
+        await track_akool_task(task_id, kind=mode, faceswap_status=0, job_id=data.get("data", {}).get("job_id"), **track_info)
+        if dedup_key:
+            await record_faceswap_dedup(dedup_key, task_id)
+        return data
+
+    submission = asyncio.create_task(submit())
+    remaining = remaining_budget()
+    done, _ = await asyncio.wait({submission}, timeout=max(0.0, remaining) if remaining is not None else None)
+    if done:
+        return submission.result()
+
+    await record_deadline_miss("vendor")
+    job_id = uuid.uuid4().hex
+    await get_state().set_json(
+        f"faceswap_job:{job_id}", {"job_id": job_id, "kind": mode, "status": "submitting"}, ttl=AKOOL_TASK_TTL_SECONDS
+    )
+    run_in_background(finish_faceswap_job(job_id, mode, submission))
+    print(f"Akool {mode} submission still running at the request deadline; handed off as job {job_id}")
+    return {"job_id": job_id}
+
+
+async def finish_faceswap_job(job_id: str, mode: str, submission: asyncio.Task):
+    record = {"job_id": job_id, "kind": mode}
+    try:
+        data = await submission
+        record.update({
+            "status": "submitted",
+            "akool_task_id": data.get("data", {}).get("_id"),
+            "akool_job_id": data.get("data", {}).get("job_id")
+        })
+    except httpx.HTTPStatusError as hse:
+        record.update({"status": "failed", "error": f"Akool API request failed with status {hse.response.status_code}."})
+    except HTTPException as he:
+        record.update({"status": "failed", "error": he.detail})
+    except Exception as e:
+        record.update({"status": "failed", "error": f"Unexpected error: {str(e)}"})
+    print(f"Handed-off faceswap job {job_id} finished: {record}")
+    await get_state().set_json(f"faceswap_job:{job_id}", record, ttl=AKOOL_TASK_TTL_SECONDS)
+
+
+def elevenlabs_voice_settings(**settings):
+    from elevenlabs import VoiceSettings  # Deferred with the rest of the ElevenLabs SDK
+    return VoiceSettings(**settings)
+
+
+def synthesize_speech_bytes(
+    text: str, voice_id: str, model_id: str, similarity_boost: float = 0.75,
+    output_format: str = DEFAULT_AUDIO_FORMAT.elevenlabs_format
+) -> bytes:
+    """Blocking ElevenLabs TTS call; returns the whole clip. Narrator lines use similarity_boost=0.7."""
+    elevenlabs_client = get_elevenlabs_client()
+    if not elevenlabs_client:
+        raise RuntimeError("ElevenLabs client not initialized. Check API key.")
+    audio_stream = elevenlabs_client.text_to_speech.convert(
+        text=text,
+        voice_id=voice_id,
+        model_id=model_id,
+        voice_settings=elevenlabs_voice_settings(
+            stability=0.7, 
+            similarity_boost=similarity_boost, 
+            style=0.0, # adjust if using stylistic voices
+            use_speaker_boost=True
+        ),
+        output_format=output_format
+    )
+    return b"".join(audio_stream)
+
+
+async def synthesize_speech_bytes_async(
+    text: str, voice_id: str, model_id: str, similarity_boost: float = 0.75,
+    output_format: str = DEFAULT_AUDIO_FORMAT.elevenlabs_format
+) -> bytes:
+    # The ElevenLabs SDK is synchronous; keep it off the event loop
+    with stage_timer("vendor"):
+        return await anyio.to_thread.run_sync(synthesize_speech_bytes, text, voice_id, model_id, similarity_boost, output_format)
+
+
+async def render_speech(
+    text: str, voice_id: str, model_id: str, audio_format: AudioFormat,
+    similarity_boost: float = 0.75, source_audio: Optional[bytes] = None
+) -> bytes:
+    """Speech in audio_format, synthesized natively by ElevenLabs.
+
+    source_audio (e.g. prefetched) is default-format audio of the same line; it is only reused when
+    the default format was asked for.
+    """
+    if source_audio is not None and audio_format is DEFAULT_AUDIO_FORMAT:
+        return source_audio
+    return await synthesize_speech_bytes_async(text, voice_id, model_id, similarity_boost, audio_format.elevenlabs_format)
+
+
+async def speech_response(audio: bytes, audio_format: AudioFormat) -> StreamingResponse:
+    await record_audio_output(audio_format, len(audio))
+    return StreamingResponse(io.BytesIO(audio), media_type=audio_format.media_type, headers=audio_response_headers(audio_format))
+
+
+def audio_response_headers(audio_format: AudioFormat) -> Dict[str, str]:
+    # The format can depend on Accept, so shared caches must key on it
+    return {"X-Audio-Format": audio_format.name, "Vary": "Accept"}
+
+
+def personalize_script_text(text: str, name: Optional[str], age: Optional[str]) -> str:
+    return text.replace("{name}", name or "").replace("{age}", age or "")
+
+
+async def clone_voice_from_upload(audio_file: UploadFile) -> Optional[str]:
+    elevenlabs_client = get_elevenlabs_client()
+    if not elevenlabs_client:
+        raise HTTPException(status_code=500, detail="ElevenLabs client not initialized. Check API key.")
+    add_voice = functools.partial(
+        elevenlabs_client.voices.add,
+        name=f"UserClonedVoice_{uuid.uuid4().hex[:6]}", # Unique name
+        description="Voice cloned from user recording for deepfake awareness.",
+        # The SDK's add method for voices expects a list of file-like objects or paths
+        files=[audio_file.file],
+    )
+    try:
+        # The ElevenLabs SDK is synchronous; keep it off the event loop
+        with stage_timer("vendor"):
+            voice = await anyio.to_thread.run_sync(add_voice)
+        return voice.voice_id if voice else None
+    except Exception as e:
+        print(f"Error cloning voice with ElevenLabs: {e}")
+        # Attempt to parse ElevenLabs specific error if possible
+        error_detail = str(e)
+        if hasattr(e, 'body') and isinstance(e.body, dict) and 'detail' in e.body: # type: ignore
+            error_detail = e.body['detail'] # type: ignore
+        raise HTTPException(status_code=500, detail=f"Error cloning voice: {error_detail}")
+
+
+speech_prefetch = SpeechPrefetchStore(
+    synthesize_speech_bytes_async,
+    max_concurrency=SPEECH_PREFETCH_MAX_CONCURRENCY,
+    ttl_seconds=SPEECH_PREFETCH_TTL_SECONDS
+)
+
+
 # New helper to stream video from a URL
 async def stream_video_from_url_helper(video_url: str):
     async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
@@ -237,8 +760,63 @@ async def read_root():
         "version": "1.0.0"
     }
 
+@app.get("/api/warmup")
+async def warmup_endpoint():
+    """Pre-initializes the vendor clients (e.g. from a cron ping) so user requests skip that cost."""
+    report = await anyio.to_thread.run_sync(warm_up_clients)
+    print(f"Warm-up complete: {report}")
+    return {"status": "warm", "clients": report}
+
+def require_admin_token(request: Request):
+    token = request.headers.get("x-admin-token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required.")
+
+@app.get("/api/admin/profiles")
+async def list_profiles_endpoint(request: Request):
+    """Lists stored request profiles (newest first). Requires X-Admin-Token: $ADMIN_TOKEN."""
+    require_admin_token(request)
+    profiles = await anyio.to_thread.run_sync(list_profiles)
+    return {"profiling_enabled": PROFILING_ENABLED, "sample_rate": PROFILE_SAMPLE_RATE, "profiles": profiles}
+
+@app.get("/api/admin/profiles/{name}")
+async def get_profile_endpoint(name: str, request: Request):
+    """Downloads one profile; open it at https://www.speedscope.app."""
+    require_admin_token(request)
+    path = profile_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {name}")
+    return FileResponse(path, media_type="application/json", filename=name)
+
+@app.get("/api/admin/deadline-misses")
+async def deadline_misses_endpoint(request: Request):
+    """Per-stage count of requests that ran out of time budget (last 7 days)."""
+    require_admin_token(request)
+    return {"budget_seconds": REQUEST_BUDGET_SECONDS, "misses": await deadline_miss_counts()}
+
+@app.get("/api/admin/upload-stats")
+async def upload_stats_endpoint(request: Request):
+    """Accepted/rejected upload counts and bytes plus ingestion throughput (last 7 days)."""
+    require_admin_token(request)
+    return await ingest_stats()
+
+@app.get("/api/admin/audio-format-stats")
+async def audio_format_stats_endpoint(request: Request):
+    """Responses and bytes per TTS output format, and bytes saved versus mp3_128 (last 7 days)."""
+    require_admin_token(request)
+    return await audio_format_stats()
+
+@app.get("/api/admin/traffic-capture")
+async def traffic_capture_endpoint(request: Request):
+    """Downloads the captured request traces (JSON lines) for benchmarks/replay.py."""
+    require_admin_token(request)
+    if not os.path.isfile(TRAFFIC_CAPTURE_PATH):
+        raise HTTPException(status_code=404, detail="No traffic captured yet. Is TRAFFIC_CAPTURE_ENABLED set?")
+    return FileResponse(TRAFFIC_CAPTURE_PATH, media_type="application/x-ndjson", filename="traffic.jsonl")
+
 @app.post("/api/test-elevenlabs-tts")
 async def test_elevenlabs_tts():
+    elevenlabs_client = get_elevenlabs_client()
     if not elevenlabs_client:
         raise HTTPException(status_code=500, detail="ElevenLabs client not initialized.")
     
@@ -253,7 +831,7 @@ async def test_elevenlabs_tts():
             text=test_text,
             voice_id=test_voice_id,
             model_id=test_model_id,
-            voice_settings=VoiceSettings(
+            voice_settings=elevenlabs_voice_settings(
                 stability=0.7,
                 similarity_boost=0.7,
                 style=0.0,
@@ -276,38 +854,30 @@ async def test_elevenlabs_tts():
         raise HTTPException(status_code=500, detail=error_detail_msg)
 
 @app.post("/api/generate-elevenlabs-speech")
-async def generate_elevenlabs_speech_endpoint(payload: ElevenLabsSpeechRequest):
+async def generate_elevenlabs_speech_endpoint(payload: ElevenLabsSpeechRequest, request: Request):
+    elevenlabs_client = get_elevenlabs_client()
     if not elevenlabs_client:
         raise HTTPException(status_code=500, detail="ElevenLabs client not initialized. Check API key.")
 
     if not payload.text:
         raise HTTPException(status_code=400, detail="No text provided for speech generation.")
 
-    print(f"ElevenLabs Speech Request: Text='{payload.text[:70]}...', VoiceID='{payload.voice_id}', Model='{payload.model_id}'")
+    audio_format = negotiate_audio_format(payload.output_format, request.headers.get("accept"))
+    print(f"ElevenLabs Speech Request: Text='{payload.text[:70]}...', VoiceID='{payload.voice_id}', Model='{payload.model_id}', Format='{audio_format.name}'")
+
+    prefetched_audio = None
+    if payload.session_id:
+        # Prefetches are always the default MP3, so other formats are synthesized on demand
+        prefetched_audio = await speech_prefetch.get(payload.session_id, payload.text, payload.voice_id, payload.model_id)
+        if prefetched_audio:
+            print(f"Serving prefetched speech for session {payload.session_id}")
 
     try:
-        audio_stream = elevenlabs_client.text_to_speech.convert(
-            text=payload.text,
-            voice_id=payload.voice_id,
-            model_id=payload.model_id,
-            voice_settings=VoiceSettings(
-                stability=0.7, 
-                similarity_boost=0.75, 
-                style=0.0, # adjust if using stylistic voices
-                use_speaker_boost=True
-            ),
-            output_format="mp3_44100_128" # Ensure this matches your needs
+        audio_content = await render_speech(
+            payload.text, payload.voice_id, payload.model_id, audio_format, source_audio=prefetched_audio
         )
-        
-        # It's better to stream the response directly if the client supports it.
-        # accumulate all chunks and then return
-        
-        audio_bytes_list = []
-        for chunk in audio_stream:
-            audio_bytes_list.append(chunk)
-        audio_content = b"".join(audio_bytes_list)
 
-        return StreamingResponse(io.BytesIO(audio_content), media_type="audio/mpeg")
+        return await speech_response(audio_content, audio_format)
 
     except Exception as e:
         error_message = f"ElevenLabs speech generation failed: {str(e)}"
@@ -322,52 +892,98 @@ async def generate_elevenlabs_speech_endpoint(payload: ElevenLabsSpeechRequest):
                  error_detail_msg = f"ElevenLabs API Error: {detail}"
         raise HTTPException(status_code=500, detail=error_detail_msg)
 
+@app.post("/api/prefetch-speech")
+async def prefetch_speech_endpoint(payload: SpeechPrefetchRequest, request: Request):
+    """Starts synthesizing the upcoming personalized lines so later speech requests return instantly."""
+    await enforce_rate_limit(request, "speech_prefetch", RATE_LIMIT_SPEECH_PREFETCH_PER_MINUTE)
+    if not get_elevenlabs_client():
+        raise HTTPException(status_code=500, detail="ElevenLabs client not initialized. Check API key.")
+    if not payload.scripts:
+        raise HTTPException(status_code=400, detail="No scripts provided for prefetch.")
+    if len(payload.scripts) > SPEECH_PREFETCH_MAX_SCRIPTS:
+        raise HTTPException(status_code=400, detail=f"Too many scripts to prefetch (max {SPEECH_PREFETCH_MAX_SCRIPTS}).")
+
+    session_id = payload.session_id or uuid.uuid4().hex
+    scheduled = []
+    for script in payload.scripts:
+        text = personalize_script_text(script.text, payload.name, payload.age)
+        if not text.strip():
+            continue
+        speech_prefetch.schedule(session_id, text, payload.voice_id, payload.model_id)
+        # The client must send back exactly this text (with session_id) to hit the prefetch
+        scheduled.append({"script_id": script.script_id, "text": text})
+
+    print(f"Speech prefetch scheduled for session {session_id}: {len(scheduled)} scripts")
+    return {"session_id": session_id, "scheduled": scheduled, "expires_in": SPEECH_PREFETCH_TTL_SECONDS}
+
+
+@app.delete("/api/prefetch-speech/{session_id}")
+async def cancel_speech_prefetch_endpoint(session_id: str):
+    """Called when the session ends; cancels prefetches that were never used."""
+    cancelled = await speech_prefetch.cancel_session(session_id)
+    print(f"Speech prefetch for session {session_id} ended, cancelled {cancelled} pending syntheses")
+    return {"session_id": session_id, "cancelled": cancelled}
+
 @app.post("/api/clone-voice")
-async def clone_voice(audio_file: UploadFile = File(...)):
+async def clone_voice(request: Request, form: IngestedForm = Depends(ingest_audio_upload)):
+    audio_file = form.file("audio_file")
+    elevenlabs_client = get_elevenlabs_client()
     if not elevenlabs_client:
         raise HTTPException(status_code=500, detail="ElevenLabs client not initialized. Check API key.")
-    try:
-        # Ensure audio_file.file is directly passed if the SDK expects a file-like object
-        # The SDK's add method for voices typically expects a list of file-like objects or paths
-        voice = elevenlabs_client.voices.add(
-            name=f"UserClonedVoice_{uuid.uuid4().hex[:6]}", # Unique name
-            description="Voice cloned from user recording for deepfake awareness.",
-            files=[audio_file.file], # Changed this line
-        )
-        return {"voice_id": voice.voice_id if voice else None}
-    except Exception as e:
-        print(f"Error cloning voice with ElevenLabs: {e}")
-        # Attempt to parse ElevenLabs specific error if possible
-        error_detail = str(e)
-        if hasattr(e, 'body') and isinstance(e.body, dict) and 'detail' in e.body: # type: ignore
-            error_detail = e.body['detail'] # type: ignore
-        raise HTTPException(status_code=500, detail=f"Error cloning voice: {error_detail}")
+    await enforce_rate_limit(request, "clone_voice", RATE_LIMIT_VOICE_CLONE_PER_MINUTE)
+    return {"voice_id": await clone_voice_from_upload(audio_file)}
 
 
 @app.post("/api/generate-narrator-speech")
-async def generate_narrator_speech_endpoint(request_data: NarratorSpeechRequest):
+async def generate_narrator_speech_endpoint(request_data: NarratorSpeechRequest, request: Request):
+    elevenlabs_client = get_elevenlabs_client()
     if not elevenlabs_client:
         print("Error: ElevenLabs client not initialized. Check API key in .env")
         raise HTTPException(status_code=500, detail="ElevenLabs client not available. Configuration issue.")
     
+    audio_format = negotiate_audio_format(request_data.output_format, request.headers.get("accept"))
     try:
-        print(f"Narrator speech request: Text='{request_data.text[:50]}...', VoiceID='{request_data.voice_id}', Model='{request_data.model_id}'")
-        
+        print(f"Narrator speech request: Text='{request_data.text[:50]}...', VoiceID='{request_data.voice_id}', Model='{request_data.model_id}', Format='{audio_format.name}'")
+
+        chunks = split_sentences(request_data.text) if request_data.chunked and audio_format.concatenable else []
+        if len(chunks) > 1:
+            print(f"Narrator speech: synthesizing {len(chunks)} sentence chunks (concurrency {NARRATOR_CHUNK_CONCURRENCY})")
+
+            async def synthesize_chunk(text: str) -> bytes:
+                return await render_speech(text, request_data.voice_id, request_data.model_id, audio_format, similarity_boost=0.7)
+
+            audio_chunks = await chunked_speech_stream(
+                chunks,
+                request_data.voice_id,
+                request_data.model_id,
+                settings_key=f"narrator:0.7:0.7:{audio_format.name}",
+                synthesize=synthesize_chunk,
+                max_concurrency=NARRATOR_CHUNK_CONCURRENCY,
+                cache_ttl=NARRATOR_CHUNK_CACHE_TTL_SECONDS
+            )
+            return StreamingResponse(
+                metered_audio_stream(audio_chunks, audio_format),
+                media_type=audio_format.media_type, headers=audio_response_headers(audio_format)
+            )
+
         # Corrected to use text_to_speech.convert and adjusted parameters
         audio_stream = elevenlabs_client.text_to_speech.convert(
             text=request_data.text,
             voice_id=request_data.voice_id, # Use the voice_id from the request
             model_id=request_data.model_id,
-            voice_settings=VoiceSettings( # Added explicit voice settings
+            voice_settings=elevenlabs_voice_settings( # Added explicit voice settings
                 stability=0.7, # Default or adjust as needed
                 similarity_boost=0.7, # Default or adjust as needed
                 style=0.0, # Default or adjust as needed
                 use_speaker_boost=True # Default or adjust as needed
             ),
-            output_format="mp3_44100_128"
+            output_format=audio_format.elevenlabs_format
         )
         
-        return StreamingResponse(audio_stream, media_type="audio/mpeg")
+        return StreamingResponse(
+            metered_audio_stream(audio_stream, audio_format),
+            media_type=audio_format.media_type, headers=audio_response_headers(audio_format)
+        )
 
     except Exception as e:
         error_message = f"Failed to generate narrator speech: {str(e)}"
@@ -385,14 +1001,16 @@ async def generate_narrator_speech_endpoint(request_data: NarratorSpeechRequest)
 
 @app.post("/api/initiate-faceswap")
 async def initiate_faceswap_endpoint(
-    user_image: UploadFile = File(...),
+    request: Request,
     section: str = Query(...),  # "FAKE_NEWS" or "IDENTITY_THEFT"
     scenario: str = Query(...),  # "SCENARIO1" or "SCENARIO2"
-    gender: str = Query(...)  # "male" or "female"
+    gender: str = Query(...),  # "male" or "female"
+    form: IngestedForm = Depends(ingest_image_upload)
 ):
+    user_image = form.file("user_image")
     print(f"Received faceswap request for file: {user_image.filename}")
     
-    if not s3_client:
+    if not get_s3_client():
         error_msg = "S3 client not initialized. Check server logs and .env configuration."
         print(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
@@ -401,25 +1019,20 @@ async def initiate_faceswap_endpoint(
         error_msg = "Akool API key not configured"
         print(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
-    
+
+    await enforce_rate_limit(request, "faceswap", RATE_LIMIT_FACESWAP_PER_MINUTE)
+
+    dedup_key = None
+    dedup_recorded = False
     try:
         # Get the face configuration for the selected scenario
-        if section not in FACE_CONFIGS:
-            raise HTTPException(status_code=400, detail=f"Invalid section: {section}")
-        
-        scenario_config = FACE_CONFIGS[section].get(scenario)
-        if not scenario_config:
-            raise HTTPException(status_code=400, detail=f"Invalid scenario: {scenario}")
-        
-        # Get gender-specific configuration
-        if gender not in scenario_config:
-            raise HTTPException(status_code=400, detail=f"Invalid gender: {gender}")
-        
-        gender_specific_config = scenario_config[gender]
-        if "image_swap" not in gender_specific_config or not gender_specific_config["image_swap"]:
-            raise HTTPException(status_code=400, detail=f"No image_swap configuration found for {section}/{scenario}/{gender}.")
+        image_swap_config = resolve_faceswap_target(section, scenario, gender, "image")
 
-        target_config = gender_specific_config["image_swap"]["targetImage"]
+        dedup_key = faceswap_dedup_key(user_image.sha256, "image", image_swap_config, 0)
+        duplicate = await claim_faceswap_dedup(dedup_key)
+        if duplicate:
+            dedup_recorded = True # Owned by the earlier request; don't release it
+            return deduplicated_faceswap_response(duplicate)
         
         # Upload image to S3
         print("Uploading image to S3...")
@@ -435,67 +1048,28 @@ async def initiate_faceswap_endpoint(
             raise HTTPException(status_code=400, detail=error_msg)
         print(f"Source face landmarks obtained: {source_landmarks}")
         
-        # Call Akool faceswap API
+        # Call Akool faceswap API. Once the POST is sent Akool may create (and bill) the job, so a
+        # submission still running at the request deadline is handed off instead of cancelled.
         print("Calling Akool faceswap API...")
-        faceswap_url = f"{AKOOL_API_BASE_URL}/faceswap/highquality/specifyimage"
-        headers = {
-            "Authorization": f"Bearer {AKOOL_API_KEY}",
-            "Content-Type": "application/json"
-        }
+        dedup_recorded = True # The submission records or releases the dedup claim from here on
+        data = await submit_faceswap_within_budget(
+            "image", image_url, source_landmarks, image_swap_config, 0, dedup_key,
+            section=section, scenario=scenario, gender=gender
+        )
+        if "job_id" in data:
+            return JSONResponse(status_code=202, content={
+                "job_id": data["job_id"],
+                "status": "submitting",
+                "message": f"Faceswap submission is still in progress. Poll /api/faceswap-job/{data['job_id']} for the task ID."
+            })
         
-        payload = {
-            "sourceImage": [
-                {
-                    "path": image_url,
-                    "opts": source_landmarks
-                }
-            ],
-            "targetImage": [
-                {
-                    "path": target_config["path"],
-                    "opts": target_config["opts"]
-                }
-            ],
-            "face_enhance": 0,
-            "modifyImage": target_config["path"],
-            "webhookUrl": AKOOL_WEBHOOK_URL if AKOOL_WEBHOOK_URL else None
+        return {
+            "akool_task_id": data.get("data", {}).get("_id"),
+            "akool_job_id": data.get("data", {}).get("job_id"),
+            "message": data.get("msg", "Faceswap image generation completed"),
+            "details": None,
+            "direct_url": data.get("data", {}).get("url")
         }
-        
-        print(f"Akool Faceswap Request URL: {faceswap_url}")
-        print(f"Akool Faceswap Request Headers: {json.dumps(headers, indent=2)}")
-        print(f"Akool Faceswap Request Payload: {json.dumps(payload, indent=2)}")
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(faceswap_url, headers=headers, json=payload)
-            response_text = response.text
-            print(f"Akool Faceswap Raw Response Status: {response.status_code}")
-            print(f"Akool Faceswap Raw Response Headers: {json.dumps(dict(response.headers), indent=2)}")
-            print(f"Akool Faceswap Raw Response Body: {response_text}")
-
-            response.raise_for_status()
-            
-            try:
-                data = response.json()
-            except json.JSONDecodeError:
-                error_msg = "Failed to decode JSON response from Akool faceswap API."
-                print(f"{error_msg} Response text was: {response_text}")
-                raise HTTPException(status_code=502, detail=error_msg)
-
-            print(f"Akool faceswap Parsed JSON Response: {json.dumps(data, indent=2)}")
-            
-            if data.get("code") != 1000:
-                error_msg = f"Akool faceswap API error. Code: {data.get('code')}. Message: {data.get('msg', 'No specific error message provided by Akool.')}"
-                print(error_msg)
-                print(f"Full Akool error response: {json.dumps(data)}")
-                raise HTTPException(status_code=500, detail=error_msg)
-            
-            return {
-                "akool_task_id": data.get("data", {}).get("_id"),
-                "akool_job_id": data.get("data", {}).get("job_id"),
-                "message": data.get("msg", "Faceswap image generation completed"),
-                "details": None,
-                "direct_url": data.get("data", {}).get("url")
-            }
             
     except httpx.HTTPStatusError as hse:
         error_body = hse.response.text
@@ -516,20 +1090,40 @@ async def initiate_faceswap_endpoint(
         print("Traceback:")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=error_msg)
+    finally:
+        if dedup_key and not dedup_recorded:
+            await release_faceswap_dedup(dedup_key)
 
 
-@app.get("/api/faceswap-status/{task_id}")
-async def get_faceswap_status_endpoint(task_id: str):
+async def fetch_faceswap_status(task_id: str) -> dict:
+    """Current status of an Akool task, from tracked state once it's terminal. Raises HTTPException on failure."""
     if not AKOOL_API_KEY:
         raise HTTPException(status_code=500, detail="Server configuration error: AKOOL_API_KEY not set.")
 
+    # Finished tasks never change again, so answer from shared state without calling Akool
+    tracked = await get_state().get_json(f"akool_task:{task_id}")
+    if tracked and tracked.get("faceswap_status") in AKOOL_TERMINAL_STATUSES and tracked.get("status_details"):
+        print(f"Serving tracked terminal status for task_id: {task_id}")
+        schedule_result_archive(task_id, tracked)
+        return {
+            "task_id": task_id,
+            "status_details": tracked["status_details"],
+            "result_url": stable_result_url(task_id, tracked),
+            "archived_url": tracked.get("archived_url"),
+            "video_assets": tracked.get("video_assets")
+        }
+
     status_api_url = f"https://openapi.akool.com/api/open/v3/faceswap/result/listbyids?_ids={task_id}"
     headers = {"Authorization": f"Bearer {AKOOL_API_KEY}"}
 
     print(f"Polling Akool status for task_id: {task_id}")
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    async with httpx.AsyncClient() as client:
         try:
-            response = await client.get(status_api_url, headers=headers)
+            with stage_timer("vendor"):
+                response = await call_with_budget(
+                    "vendor", AKOOL_STATUS_TIMEOUT_SECONDS,
+                    lambda timeout: client.get(status_api_url, headers=headers, timeout=timeout)
+                )
             response.raise_for_status()
             status_data = response.json()
             print(f"Akool status API response for {task_id}: {status_data}")
@@ -538,7 +1132,16 @@ async def get_faceswap_status_endpoint(task_id: str):
                 results = status_data["data"]["result"]
                 if results:
                     # Return the first result, which should correspond to the task_id
-                    return {"task_id": task_id, "status_details": results[0]}
+                    status_details = results[0]
+                    await track_akool_task(
+                        task_id,
+                        faceswap_status=status_details.get("faceswap_status"),
+                        status_details=status_details
+                    )
+                    # Start copying the result to S3 as soon as Akool reports it done
+                    tracked = await get_state().get_json(f"akool_task:{task_id}")
+                    schedule_result_archive(task_id, tracked)
+                    return {"task_id": task_id, "status_details": status_details, "result_url": stable_result_url(task_id, tracked)}
                 else:
                     # Akool might return an empty result list if the task ID is very new or invalid
                     return {"task_id": task_id, "status_details": {"faceswap_status": 0, "msg": "No results found for this task ID yet or ID is invalid."}}
@@ -553,11 +1156,71 @@ async def get_faceswap_status_endpoint(task_id: str):
             except json.JSONDecodeError: pass
             print(f"Akool status API HTTP error: {e.response.status_code} - {error_details}")
             raise HTTPException(status_code=e.response.status_code, detail=f"Akool status API request failed: {error_details}")
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"Unexpected error calling Akool status API: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to get faceswap status: {str(e)}")
 
 
+@app.get("/api/faceswap-status/{task_id}")
+async def get_faceswap_status_endpoint(task_id: str):
+    return await fetch_faceswap_status(task_id)
+
+
+@app.get("/api/faceswap-result/{task_id}")
+async def get_faceswap_result_endpoint(task_id: str):
+    """Redirects to the archived copy of a finished result; the redirect is safe to cache forever."""
+    tracked = await get_state().get_json(f"akool_task:{task_id}")
+    if not tracked:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired faceswap task: {task_id}")
+
+    archived_url = tracked.get("archived_url")
+    if not archived_url:
+        if tracked.get("faceswap_status") != AKOOL_STATUS_SUCCESS:
+            raise HTTPException(status_code=409, detail="Faceswap result is not ready yet. Poll /api/faceswap-status first.")
+        # Archive inline if the background copy hasn't happened (e.g. the worker was frozen)
+        archived_url = await archive_akool_result(task_id)
+        if not archived_url:
+            raise HTTPException(status_code=503, detail="Result is being archived. Please try again shortly.", headers={"Retry-After": "2"})
+
+    return RedirectResponse(archived_url, status_code=308, headers={"Cache-Control": ARCHIVE_CACHE_CONTROL})
+
+
+@app.get("/api/faceswap-video-assets/{task_id}")
+async def get_faceswap_video_assets_endpoint(task_id: str):
+    """Faststart video, poster frame and optional mobile rendition for a finished video faceswap."""
+    tracked = await get_state().get_json(f"akool_task:{task_id}")
+    if not tracked:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired faceswap task: {task_id}")
+    if tracked.get("video_assets"):
+        return {"task_id": task_id, "status": "ready", **tracked["video_assets"]}
+    if tracked.get("faceswap_status") != AKOOL_STATUS_SUCCESS:
+        raise HTTPException(status_code=409, detail="Faceswap video is not ready yet. Poll /api/faceswap-status first.")
+    if not postprocess_enabled():
+        # No ffmpeg on this host: fall back to the unprocessed (archived, if available) result
+        fallback_url = tracked.get("archived_url") or (tracked.get("status_details") or {}).get("url")
+        return {"task_id": task_id, "status": "unprocessed", "video": fallback_url}
+
+    # Lock-guarded, so repeated polls don't start duplicate jobs
+    run_in_background(archive_and_postprocess(task_id))
+    return JSONResponse(status_code=202, content={"task_id": task_id, "status": "processing"}, headers={"Retry-After": "3"})
+
+
+async def open_upstream(client: httpx.AsyncClient, url: str, headers: Dict[str, str]) -> httpx.Response:
+    """Sends a GET without reading the body; the proxy stage covers the upstream's time to first byte.
+
+    The caller must close the response (aclose) once the body has been read or streamed.
+    """
+    with stage_timer("proxy"):
+        return await client.send(client.build_request("GET", url, headers=headers), stream=True)
+
+
+async def close_upstream(response: httpx.Response, client: httpx.AsyncClient):
+    await response.aclose()
+    await client.aclose()
+
+
 @app.get("/api/stream-video")
 async def stream_video(url: str = Query(...)):
     print(f"[STREAM_VIDEO_PROXY] Received request for URL: {url}")
@@ -578,7 +1241,9 @@ async def stream_video(url: str = Query(...)):
             print(f"[STREAM_VIDEO_PROXY] Invalid URL format after decoding: {decoded_url}")
             raise HTTPException(status_code=400, detail="Invalid URL format for streaming after decoding.")
 
-        async with httpx.AsyncClient(follow_redirects=True, timeout=60.0) as client:
+        # Not a context manager: the client has to outlive this function while the body streams
+        client = httpx.AsyncClient(follow_redirects=True, timeout=60.0)
+        try:
             print(f"[STREAM_VIDEO_PROXY] Preparing to fetch video from: {decoded_url}")
             
             request_headers = {
@@ -601,11 +1266,13 @@ async def stream_video(url: str = Query(...)):
                  # If these are direct media links from Akool that require auth, add it here too.
 
             print(f"[STREAM_VIDEO_PROXY] Requesting with headers: {json.dumps(request_headers)}")
-            resp = await client.get(decoded_url, headers=request_headers)
+            resp = await open_upstream(client, decoded_url, request_headers)
             
             print(f"[STREAM_VIDEO_PROXY] Source video response status: {resp.status_code}")
             print(f"[STREAM_VIDEO_PROXY] Source video response headers: {json.dumps(dict(resp.headers))}")
 
+            if resp.is_error:
+                await resp.aread() # The error body is logged below
             resp.raise_for_status() # This will raise HTTPStatusError for 4xx/5xx responses
 
             # If we get here, status is 2xx
@@ -622,7 +1289,13 @@ async def stream_video(url: str = Query(...)):
             }
             response_stream_headers = {k: v for k, v in response_stream_headers.items() if v} # Filter empty headers
 
-            return StreamingResponse(resp.aiter_bytes(), media_type="video/mp4", headers=response_stream_headers, status_code=resp.status_code)
+            return StreamingResponse(
+                resp.aiter_bytes(), media_type="video/mp4", headers=response_stream_headers, status_code=resp.status_code,
+                background=BackgroundTask(close_upstream, resp, client)
+            )
+        except BaseException:
+            await client.aclose()
+            raise
 
     except httpx.HTTPStatusError as e:
         error_body_for_log = e.response.text[:500] if hasattr(e.response, 'text') else 'No response body text.'
@@ -660,43 +1333,46 @@ async def stream_image(url: str = Query(...)):
             }
             
             # Make the GET request with headers
-            resp = await client.get(url, headers=headers)
+            resp = await open_upstream(client, url, headers)
             
-            print(f"[STREAM_IMAGE] Source response status: {resp.status_code}")
-            print(f"[STREAM_IMAGE] Source response headers: {resp.headers}")
+            try:
+                print(f"[STREAM_IMAGE] Source response status: {resp.status_code}")
+                print(f"[STREAM_IMAGE] Source response headers: {resp.headers}")
 
-            if resp.status_code == 200:
-                print(f"[STREAM_IMAGE] Successfully fetched image. Content-Type from source: {resp.headers.get('Content-Type')}")
+                if resp.status_code == 200:
+                    print(f"[STREAM_IMAGE] Successfully fetched image. Content-Type from source: {resp.headers.get('Content-Type')}")
                 
-                # Determine the correct content type from the response
-                content_type = resp.headers.get('Content-Type', 'image/png')
+                    # Determine the correct content type from the response
+                    content_type = resp.headers.get('Content-Type', 'image/png')
                 
-                # Create response headers
-                response_headers = {
-                    "Content-Type": content_type,
-                    "Content-Length": resp.headers.get("Content-Length", ""),
-                    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-                    "Pragma": "no-cache",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "Content-Type, Authorization",
-                }
-                # Filter out empty headers
-                response_headers = {k: v for k, v in response_headers.items() if v}
-
-                # Read the entire image data
-                image_data = await resp.aread()
-                return Response(content=image_data, media_type=content_type, headers=response_headers)
-            else:
-                body_bytes = await resp.aread()
-                error_body_for_log = body_bytes[:500].decode(errors='replace')
-                print(f"[STREAM_IMAGE] Error fetching image from source. Status: {resp.status_code}, Body (first 500 bytes): {error_body_for_log!r}")
-                
-                # If it's a CloudFront error, try to get a fresh URL from the backend
-                if "cloudfront" in url.lower() and resp.status_code == 403:
-                    raise HTTPException(status_code=503, detail="CloudFront URL expired. Please try again.")
+                    # Create response headers
+                    response_headers = {
+                        "Content-Type": content_type,
+                        "Content-Length": resp.headers.get("Content-Length", ""),
+                        "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+                        "Pragma": "no-cache",
+                        "Access-Control-Allow-Origin": "*",
+                        "Access-Control-Allow-Methods": "GET, OPTIONS",
+                        "Access-Control-Allow-Headers": "Content-Type, Authorization",
+                    }
+                    # Filter out empty headers
+                    response_headers = {k: v for k, v in response_headers.items() if v}
+
+                    # Read the entire image data
+                    image_data = await resp.aread()
+                    return Response(content=image_data, media_type=content_type, headers=response_headers)
                 else:
-                    raise HTTPException(status_code=resp.status_code, detail=f"Error fetching image from source: {error_body_for_log}")
+                    body_bytes = await resp.aread()
+                    error_body_for_log = body_bytes[:500].decode(errors='replace')
+                    print(f"[STREAM_IMAGE] Error fetching image from source. Status: {resp.status_code}, Body (first 500 bytes): {error_body_for_log!r}")
+                
+                    # If it's a CloudFront error, try to get a fresh URL from the backend
+                    if "cloudfront" in url.lower() and resp.status_code == 403:
+                        raise HTTPException(status_code=503, detail="CloudFront URL expired. Please try again.")
+                    else:
+                        raise HTTPException(status_code=resp.status_code, detail=f"Error fetching image from source: {error_body_for_log}")
+            finally:
+                await resp.aclose()
 
     except httpx.RequestError as e:
         print(f"[STREAM_IMAGE] httpx.RequestError while fetching image: {e}")
@@ -708,55 +1384,39 @@ async def stream_image(url: str = Query(...)):
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred while trying to stream image: {str(e)}")
 
 
-# Add OPTIONS handler for CORS preflight requests
-@app.options("/{full_path:path}")
-async def options_handler(request: Request, full_path: str):
-    return Response(
-        status_code=200,
-        headers={
-            "Access-Control-Allow-Origin": request.headers.get("origin", "*"),
-            "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type, Authorization",
-            "Access-Control-Allow-Credentials": "true",
-            "Access-Control-Max-Age": "3600",
-        }
-    )
-
-
 @app.post("/api/initiate-video-faceswap")
 async def initiate_video_faceswap_endpoint(
-    user_image: UploadFile = File(...),
-    section: str = Form(...),      # Changed from Query to Form
-    scenario: str = Form(...),     # Changed from Query to Form
-    gender: str = Form(...),       # Changed from Query to Form
-    face_enhance: int = Form(0)   # Added face_enhance as Form parameter, default 0
+    request: Request,
+    form: IngestedForm = Depends(ingest_image_upload) # user_image + section, scenario, gender, face_enhance (default 0)
 ):
+    user_image = form.file("user_image")
+    section = form.field("section")
+    scenario = form.field("scenario")
+    gender = form.field("gender")
+    try:
+        face_enhance = int(form.field("face_enhance", "0"))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="face_enhance must be an integer.")
     print(f"Received video faceswap request for file: {user_image.filename}, section: {section}, scenario: {scenario}, gender: {gender}, face_enhance: {face_enhance}")
 
-    if not s3_client:
+    if not get_s3_client():
         raise HTTPException(status_code=500, detail="S3 client not initialized.")
     if not AKOOL_API_KEY:
         raise HTTPException(status_code=500, detail="Akool API key not configured.")
-    
+
+    await enforce_rate_limit(request, "faceswap", RATE_LIMIT_FACESWAP_PER_MINUTE)
+
+    dedup_key = None
+    dedup_recorded = False
     try:
         # Get the video_swap configuration from FACE_CONFIGS
-        if section not in FACE_CONFIGS or \
-           scenario not in FACE_CONFIGS[section] or \
-           gender not in FACE_CONFIGS[section][scenario]:
-            raise HTTPException(status_code=400, detail=f"Invalid section, scenario, or gender for video swap config. Provided: {section}, {scenario}, {gender}")
-        
-        gender_config = FACE_CONFIGS[section][scenario][gender]
-        if "video_swap" not in gender_config or not gender_config["video_swap"]:
-            raise HTTPException(status_code=400, detail=f"No video_swap configuration found for {section}/{scenario}/{gender}.")
-        
-        video_swap_config = gender_config["video_swap"]
-        target_modify_video_url = video_swap_config["modifyVideoUrl"]
-        # target_faces_in_video will be a list of dicts, e.g., [{"opts": "...", "path": "..."}]
-        # Akool's API for specifyvideo expects this list directly for the "targetImage" field.
-        target_image_payload_from_config = video_swap_config["targetFacesInVideo"]
+        video_swap_config = resolve_faceswap_target(section, scenario, gender, "video")
 
-        if not target_modify_video_url or not target_image_payload_from_config:
-            raise HTTPException(status_code=400, detail="Incomplete video_swap configuration: modifyVideoUrl or targetFacesInVideo missing in FACE_CONFIGS.")
+        dedup_key = faceswap_dedup_key(user_image.sha256, "video", video_swap_config, face_enhance)
+        duplicate = await claim_faceswap_dedup(dedup_key)
+        if duplicate:
+            dedup_recorded = True # Owned by the earlier request; don't release it
+            return deduplicated_faceswap_response(duplicate)
 
         # Upload user image to S3
         print("Uploading user image to S3 for video faceswap...")
@@ -771,45 +1431,26 @@ async def initiate_video_faceswap_endpoint(
             raise HTTPException(status_code=400, detail="Failed to detect face in the uploaded user image. Please use a clearer image.")
         print(f"Source user image face landmarks: {source_image_landmarks}")
 
-        # Prepare payload for Akool /faceswap/highquality/specifyvideo
-        akool_faceswap_video_url = f"{AKOOL_API_BASE_URL}/faceswap/highquality/specifyvideo"
-        headers = {
-            "Authorization": f"Bearer {AKOOL_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "sourceImage": [
-                {
-                    "path": source_image_s3_url,
-                    "opts": source_image_landmarks
-                }
-            ],
-            "targetImage": target_image_payload_from_config, # Use directly from FACE_CONFIGS
-            "face_enhance": face_enhance, # Use the parameter value
-            "modifyVideo": target_modify_video_url, # Use from FACE_CONFIGS
-            "webhookUrl": AKOOL_WEBHOOK_URL if AKOOL_WEBHOOK_URL else None
+        # Submit to Akool /faceswap/highquality/specifyvideo. This POST alone can take up to a minute,
+        # so it is handed off to a background job if it outlasts the request budget.
+        dedup_recorded = True # The submission records or releases the dedup claim from here on
+        data = await submit_faceswap_within_budget(
+            "video", source_image_s3_url, source_image_landmarks, video_swap_config, face_enhance, dedup_key,
+            section=section, scenario=scenario, gender=gender
+        )
+        if "job_id" in data:
+            return JSONResponse(status_code=202, content={
+                "job_id": data["job_id"],
+                "status": "submitting",
+                "message": f"Video faceswap submission is still in progress. Poll /api/faceswap-job/{data['job_id']} for the task ID."
+            })
+
+        return {
+            "akool_task_id": data.get("data", {}).get("_id"),
+            "akool_job_id": data.get("data", {}).get("job_id"),
+            "message": data.get("msg", "Video faceswap generation started. Poll for status."),
         }
 
-        print(f"Akool Video Faceswap Request URL: {akool_faceswap_video_url}")
-        print(f"Akool Video Faceswap Payload: {json.dumps(payload, indent=2)}")
-
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(akool_faceswap_video_url, headers=headers, json=payload)
-            response_text = response.text
-            print(f"Akool Video Faceswap Raw Response Status: {response.status_code}")
-            print(f"Akool Video Faceswap Raw Response Body: {response_text}")
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get("code") != 1000:
-                raise HTTPException(status_code=500, detail=f"Akool video faceswap API error. Code: {data.get('code')}. Msg: {data.get('msg')}")
-            
-            return {
-                "akool_task_id": data.get("data", {}).get("_id"),
-                "akool_job_id": data.get("data", {}).get("job_id"),
-                "message": data.get("msg", "Video faceswap generation started. Poll for status."),
-            }
-
     except httpx.HTTPStatusError as hse:
         print(f"Akool Video Faceswap API HTTP error: {hse.response.status_code}. Response: {hse.response.text}")
         raise HTTPException(status_code=502, detail=f"Akool Video API request failed: {hse.response.status_code} - {hse.response.text[:200]}")
@@ -821,6 +1462,400 @@ async def initiate_video_faceswap_endpoint(
         print(f"Unexpected error in video faceswap: {str(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Video faceswap error: {str(e)}")
+    finally:
+        if dedup_key and not dedup_recorded:
+            await release_faceswap_dedup(dedup_key)
+
+
+@app.get("/api/faceswap-job/{job_id}")
+async def get_faceswap_job_endpoint(job_id: str):
+    """Status of a submission handed off at the request deadline; "submitted" includes akool_task_id."""
+    job = await get_state().get_json(f"faceswap_job:{job_id}")
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Faceswap job not found: {job_id}")
+    return job
+
+
+@app.post("/api/initiate-batch-faceswap")
+async def initiate_batch_faceswap_endpoint(
+    request: Request,
+    form: IngestedForm = Depends(ingest_image_upload) # user_image + targets
+):
+    """Uploads and detects the user's face once, then submits every requested faceswap concurrently."""
+    user_image = form.file("user_image")
+    targets = form.field("targets") # JSON list of {"section", "scenario", "gender", "mode", "face_enhance"?}
+    print(f"Received batch faceswap request for file: {user_image.filename}, targets: {targets}")
+
+    if not get_s3_client():
+        raise HTTPException(status_code=500, detail="S3 client not initialized.")
+    if not AKOOL_API_KEY:
+        raise HTTPException(status_code=500, detail="Akool API key not configured.")
+
+    try:
+        parsed_targets = [FaceswapTarget(**target) for target in json.loads(targets)]
+    except (json.JSONDecodeError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid targets: expected a JSON list of {{section, scenario, gender, mode}} objects. {e}")
+    if not parsed_targets:
+        raise HTTPException(status_code=400, detail="At least one faceswap target is required.")
+
+    # Reject the whole batch before doing any paid work if a single target is invalid
+    resolved_targets = [
+        (target, resolve_faceswap_target(target.section, target.scenario, target.gender, target.mode))
+        for target in parsed_targets
+    ]
+
+    await enforce_rate_limit(request, "faceswap", RATE_LIMIT_FACESWAP_PER_MINUTE)
+
+    image_hash = user_image.sha256
+    group_id = uuid.uuid4().hex
+    results: List[Optional[dict]] = [None] * len(resolved_targets)
+    to_submit = [] # (index, target, swap_config, dedup_key) for targets this request owns
+    seen_keys = set()
+    try:
+        for index, (target, swap_config) in enumerate(resolved_targets):
+            dedup_key = faceswap_dedup_key(image_hash, target.mode, swap_config, target.face_enhance)
+            if dedup_key in seen_keys:
+                results[index] = {**target.model_dump(), "error": "Duplicate target in the same batch."}
+                continue
+            seen_keys.add(dedup_key)
+            duplicate = await claim_faceswap_dedup(dedup_key)
+            if duplicate:
+                results[index] = {**target.model_dump(), **deduplicated_faceswap_response(duplicate)}
+            else:
+                to_submit.append((index, target, swap_config, dedup_key))
+
+        source_image_url = None
+        if to_submit:
+            print("Uploading user image to S3 for batch faceswap...")
+            source_image_url = await upload_to_s3(user_image, S3_BUCKET_NAME)
+            print(f"User image uploaded to S3: {source_image_url}")
+
+            print("Getting face landmarks for source user image from Akool...")
+            source_landmarks = await get_akool_face_opts(source_image_url, AKOOL_API_KEY)
+            if not source_landmarks:
+                raise HTTPException(status_code=400, detail="Failed to detect face in the uploaded user image. Please use a clearer image.")
+    except BaseException:
+        for _, _, _, dedup_key in to_submit:
+            await release_faceswap_dedup(dedup_key)
+        raise
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_AKOOL_SUBMISSIONS)
+
+    async def submit_target(target: FaceswapTarget, swap_config: dict, dedup_key: str) -> dict:
+        result = target.model_dump()
+        async with semaphore:
+            try:
+                # Tracks the task and records (or, on failure, releases) the dedup claim; a submission
+                # still running at the request deadline continues as a job instead of being cancelled
+                data = await submit_faceswap_within_budget(
+                    target.mode, source_image_url, source_landmarks, swap_config, target.face_enhance, dedup_key,
+                    section=target.section, scenario=target.scenario, gender=target.gender, group_id=group_id
+                )
+            except httpx.HTTPStatusError as hse:
+                print(f"Batch {group_id}: Akool HTTP error for {target}: {hse.response.status_code} - {hse.response.text[:200]}")
+                result["error"] = f"Akool API request failed with status {hse.response.status_code}."
+            except HTTPException as he:
+                result["error"] = he.detail
+            except Exception as e:
+                print(f"Batch {group_id}: Unexpected error submitting {target}: {e}")
+                result["error"] = f"Unexpected error: {str(e)}"
+        if "error" in result:
+            return result
+        if "job_id" in data:
+            # Resolved to an akool_task_id by /api/faceswap-group once the submission finishes
+            result.update({"job_id": data["job_id"], "status": "submitting"})
+            return result
+
+        result.update({
+            "akool_task_id": data.get("data", {}).get("_id"),
+            "akool_job_id": data.get("data", {}).get("job_id"),
+            "direct_url": data.get("data", {}).get("url")
+        })
+        return result
+
+    submitted = await asyncio.gather(*(submit_target(target, config, key) for _, target, config, key in to_submit))
+    for (index, _, _, _), result in zip(to_submit, submitted):
+        results[index] = result
+    failed = [result for result in results if "error" in result]
+    print(f"Batch {group_id}: {len(to_submit)} submitted, {len(results) - len(to_submit)} deduplicated, {len(failed)} failed")
+
+    if len(failed) == len(results):
+        raise HTTPException(status_code=502, detail={"message": "All faceswap submissions failed.", "targets": results})
+
+    group = {"group_id": group_id, "source_image_url": source_image_url, "targets": results}
+    await get_state().set_json(f"faceswap_group:{group_id}", group, ttl=AKOOL_TASK_TTL_SECONDS)
+    return group
+
+
+@app.get("/api/faceswap-group/{group_id}")
+async def get_faceswap_group_endpoint(group_id: str):
+    """Returns a batch's targets with the latest tracked status of each Akool task."""
+    state = get_state()
+    group = await state.get_json(f"faceswap_group:{group_id}")
+    if not group:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired faceswap group: {group_id}")
+
+    for target in group["targets"]:
+        if target.get("job_id") and not target.get("akool_task_id"):
+            # Submitted past the request deadline; pick up the outcome of the handed-off job
+            job = await state.get_json(f"faceswap_job:{target['job_id']}") or {}
+            target["status"] = job.get("status", target.get("status"))
+            if job.get("akool_task_id"):
+                target["akool_task_id"] = job["akool_task_id"]
+                target["akool_job_id"] = job.get("akool_job_id")
+            if job.get("error"):
+                target["error"] = job["error"]
+        task_id = target.get("akool_task_id")
+        tracked = await state.get_json(f"akool_task:{task_id}") if task_id else None
+        if tracked:
+            target["faceswap_status"] = tracked.get("faceswap_status")
+            target["status_details"] = tracked.get("status_details")
+            target["archived_url"] = tracked.get("archived_url")
+    return group
+
+
+# --- Deepfake Experience Bundle ---
+# Everything DeepfakeExperiencePlayer needs in one job: the scenario script spoken in the user's cloned
+# voice, and the video faceswap. The voice branch (clone -> TTS) and the video branch (upload -> detect
+# -> Akool) run concurrently, so the bundle takes as long as the slower branch rather than their sum.
+BUNDLE_STEPS = ("voice_clone", "speech", "video")
+BUNDLE_AUDIO_EXTENSIONS = {"audio/mpeg": "mp3", 'audio/ogg; codecs="opus"': "ogg"} # Anything else is raw PCM
+
+
+async def upload_bytes_to_s3(data: bytes, object_name: str, content_type: str) -> str:
+    s3_client = get_s3_client()
+    if not s3_client:
+        raise HTTPException(status_code=500, detail="S3 client not initialized.")
+    put_object = functools.partial(
+        s3_client.put_object, Bucket=S3_BUCKET_NAME, Key=object_name, Body=data,
+        ACL="public-read", ContentType=content_type, CacheControl=ARCHIVE_CACHE_CONTROL
+    )
+    with stage_timer("upload"):
+        await call_with_budget(
+            "upload", S3_UPLOAD_TIMEOUT_SECONDS,
+            lambda timeout: anyio.to_thread.run_sync(put_object, abandon_on_cancel=True)
+        )
+    return public_object_url(S3_BUCKET_NAME, AWS_REGION, object_name)
+
+
+def bundle_step_error(e: Exception) -> str:
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"Vendor request failed with status {e.response.status_code}."
+    if isinstance(e, HTTPException):
+        return str(e.detail)
+    return f"Unexpected error: {str(e)}"
+
+
+async def update_bundle_step(bundle_id: str, step: str, **info):
+    """Each step has its own key and a single writer, so the branches never overwrite each other."""
+    state = get_state()
+    key = f"experience_bundle:{bundle_id}:{step}"
+    record = await state.get_json(key) or {"status": "pending"}
+    now = time.time()
+    if info.get("status") == "running":
+        record["started_at"] = now
+    elif info.get("status") in ("done", "failed"):
+        record["finished_at"] = now
+        if record.get("started_at"):
+            record["duration_ms"] = round((now - record["started_at"]) * 1000)
+    record.update(info)
+    await state.set_json(key, record, ttl=AKOOL_TASK_TTL_SECONDS)
+
+
+async def run_bundle_voice(bundle_id: str, audio_file: UploadFile, script: str, model_id: str, audio_format: AudioFormat):
+    detach_deadline() # Runs in its own task and may continue past the creating request
+    await update_bundle_step(bundle_id, "voice_clone", status="running")
+    try:
+        voice_id = await clone_voice_from_upload(audio_file)
+        if not voice_id:
+            raise HTTPException(status_code=502, detail="ElevenLabs did not return a voice ID.")
+    except Exception as e:
+        print(f"Bundle {bundle_id}: voice clone failed: {e}")
+        await update_bundle_step(bundle_id, "voice_clone", status="failed", error=bundle_step_error(e))
+        await update_bundle_step(bundle_id, "speech", status="failed", error="Voice clone failed.")
+        return
+    finally:
+        await audio_file.close()
+    await update_bundle_step(bundle_id, "voice_clone", status="done", voice_id=voice_id)
+
+    await update_bundle_step(bundle_id, "speech", status="running")
+    try:
+        audio = await render_speech(script, voice_id, model_id, audio_format)
+        extension = BUNDLE_AUDIO_EXTENSIONS.get(audio_format.media_type, "pcm")
+        speech_url = await upload_bytes_to_s3(audio, f"bundle_speech/{bundle_id}.{extension}", audio_format.media_type)
+    except Exception as e:
+        print(f"Bundle {bundle_id}: speech failed: {e}")
+        await update_bundle_step(bundle_id, "speech", status="failed", error=bundle_step_error(e))
+        return
+    await record_audio_output(audio_format, len(audio))
+    await update_bundle_step(bundle_id, "speech", status="done", speech_url=speech_url, output_format=audio_format.name)
+
+
+async def run_bundle_video(bundle_id: str, user_image: UploadFile, swap_config: dict, face_enhance: int, dedup_key: str, **track_info):
+    detach_deadline()
+    await update_bundle_step(bundle_id, "video", status="running")
+    try:
+        duplicate = await claim_faceswap_dedup(dedup_key)
+        if duplicate:
+            task_id = duplicate["task_id"]
+            print(f"Bundle {bundle_id}: reusing Akool task {task_id} of an identical video faceswap")
+        else:
+            try:
+                source_image_url = await upload_to_s3(user_image, S3_BUCKET_NAME)
+                source_landmarks = await get_akool_face_opts(source_image_url, AKOOL_API_KEY)
+                if not source_landmarks:
+                    raise HTTPException(status_code=400, detail="Failed to detect face in the uploaded user image. Please use a clearer image.")
+                data = await submit_akool_faceswap("video", source_image_url, source_landmarks, swap_config, face_enhance)
+            except BaseException:
+                await release_faceswap_dedup(dedup_key)
+                raise
+            task_id = data.get("data", {}).get("_id")
+            await track_akool_task(task_id, kind="video", faceswap_status=0, job_id=data.get("data", {}).get("job_id"), **track_info)
+            await record_faceswap_dedup(dedup_key, task_id)
+            if not task_id:
+                raise HTTPException(status_code=502, detail="Akool did not return a task ID.")
+    except Exception as e:
+        print(f"Bundle {bundle_id}: video faceswap failed: {e}")
+        await update_bundle_step(bundle_id, "video", status="failed", error=bundle_step_error(e))
+        return
+    finally:
+        await user_image.close()
+    # Rendering takes minutes; polling the bundle advances this step (see refresh_bundle_video)
+    await update_bundle_step(bundle_id, "video", status="processing", akool_task_id=task_id)
+
+
+async def refresh_bundle_video(bundle_id: str, step: dict) -> dict:
+    """Checks a rendering video step against Akool (via the tracked task while it's still fresh)."""
+    try:
+        status = await fetch_faceswap_status(step["akool_task_id"])
+    except HTTPException as he:
+        # Transient status API trouble doesn't fail the bundle; the next poll tries again
+        print(f"Bundle {bundle_id}: status check failed: {he.detail}")
+        return step
+    status_details = status["status_details"]
+    faceswap_status = status_details.get("faceswap_status")
+    if faceswap_status == AKOOL_STATUS_SUCCESS:
+        await update_bundle_step(bundle_id, "video", status="done")
+    elif faceswap_status == AKOOL_STATUS_FAILED:
+        await update_bundle_step(bundle_id, "video", status="failed", error=status_details.get("alg_msg") or "Akool video generation failed.")
+    else:
+        return {**step, "faceswap_status": faceswap_status}
+    return await get_state().get_json(f"experience_bundle:{bundle_id}:video")
+
+
+async def load_experience_bundle(bundle_id: str, refresh: bool = False) -> dict:
+    state = get_state()
+    bundle = await state.get_json(f"experience_bundle:{bundle_id}")
+    if not bundle:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired experience bundle: {bundle_id}")
+
+    steps = {}
+    for step in BUNDLE_STEPS:
+        steps[step] = await state.get_json(f"experience_bundle:{bundle_id}:{step}") or {"status": "pending"}
+    if refresh and steps["video"]["status"] == "processing":
+        steps["video"] = await refresh_bundle_video(bundle_id, steps["video"])
+
+    video_url = poster_url = None
+    if steps["video"]["status"] == "done":
+        tracked = await state.get_json(f"akool_task:{steps['video']['akool_task_id']}") or {}
+        video_assets = tracked.get("video_assets") or {}
+        # Best available copy: post-processed, then archived, then Akool's own URL
+        video_url = video_assets.get("video") or tracked.get("archived_url") or (tracked.get("status_details") or {}).get("url")
+        poster_url = video_assets.get("poster")
+
+    statuses = [steps[step]["status"] for step in BUNDLE_STEPS]
+    if "failed" in statuses:
+        bundle["status"] = "failed"
+    elif all(status == "done" for status in statuses):
+        bundle["status"] = "completed"
+        # Wall-clock time from creation to the slowest step
+        bundle["duration_ms"] = round((max(steps[step]["finished_at"] for step in BUNDLE_STEPS) - bundle["created_at"]) * 1000)
+    else:
+        bundle["status"] = "processing"
+    bundle["progress"] = {"completed_steps": statuses.count("done"), "total_steps": len(BUNDLE_STEPS)}
+    bundle["steps"] = steps
+    # Filled in as each branch finishes, so the client can preload what's ready
+    bundle["assets"] = {
+        "voice_id": steps["voice_clone"].get("voice_id"),
+        "speech_url": steps["speech"].get("speech_url"),
+        "video_url": video_url,
+        "poster_url": poster_url,
+    }
+    return bundle
+
+
+@app.post("/api/experience-bundle")
+async def create_experience_bundle_endpoint(
+    request: Request,
+    # user_image + audio_file + gender; optional section, scenario, voice_scenario, face_enhance, name, age, model_id, output_format
+    form: IngestedForm = Depends(ingest_bundle_upload)
+):
+    user_image = form.file("user_image")
+    audio_file = form.file("audio_file")
+    section = form.field("section", "IDENTITY_THEFT")
+    scenario = form.field("scenario", "SCENARIO1")
+    gender = form.field("gender")
+    voice_scenario = form.field("voice_scenario", scenario)
+    model_id = form.field("model_id", "eleven_multilingual_v2")
+    try:
+        face_enhance = int(form.field("face_enhance", "0"))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="face_enhance must be an integer.")
+    # The speech is stored as a file, so only an explicit output_format applies (not this JSON request's Accept)
+    audio_format = negotiate_audio_format(form.fields.get("output_format"), None)
+
+    if not get_s3_client() or not S3_BUCKET_NAME:
+        raise HTTPException(status_code=500, detail="S3 client not initialized.")
+    if not AKOOL_API_KEY:
+        raise HTTPException(status_code=500, detail="Akool API key not configured.")
+    if not get_elevenlabs_client():
+        raise HTTPException(status_code=500, detail="ElevenLabs client not initialized. Check API key.")
+
+    # Validate everything before any paid vendor call starts
+    video_swap_config = resolve_faceswap_target(section, scenario, gender, "video")
+    script = VOICE_SCENARIO_SCRIPTS.get(section, {}).get(voice_scenario)
+    if not script:
+        raise HTTPException(status_code=400, detail=f"No voice script for {section}/{voice_scenario}.")
+    script = personalize_script_text(script, form.fields.get("name"), form.fields.get("age"))
+
+    await enforce_rate_limit(request, "faceswap", RATE_LIMIT_FACESWAP_PER_MINUTE)
+    await enforce_rate_limit(request, "clone_voice", RATE_LIMIT_VOICE_CLONE_PER_MINUTE)
+
+    bundle_id = uuid.uuid4().hex
+    await get_state().set_json(f"experience_bundle:{bundle_id}", {
+        "bundle_id": bundle_id,
+        "created_at": time.time(),
+        "section": section,
+        "scenario": scenario,
+        "voice_scenario": voice_scenario,
+        "gender": gender,
+    }, ttl=AKOOL_TASK_TTL_SECONDS)
+
+    dedup_key = faceswap_dedup_key(user_image.sha256, "video", video_swap_config, face_enhance)
+    # The branches may outlive the request, so they take over the ingested spools (and close them)
+    branches = {
+        run_in_background(run_bundle_voice(bundle_id, form.detach("audio_file"), script, model_id, audio_format)),
+        run_in_background(run_bundle_video(
+            bundle_id, form.detach("user_image"), video_swap_config, face_enhance, dedup_key,
+            section=section, scenario=scenario, gender=gender
+        )),
+    }
+    # Waiting keeps serverless instances alive while the branches submit; whatever is left continues
+    # in the background and is picked up by polling
+    remaining = remaining_budget()
+    await asyncio.wait(branches, timeout=max(0.0, remaining) if remaining is not None else None)
+
+    bundle = await load_experience_bundle(bundle_id)
+    print(f"Experience bundle {bundle_id}: {bundle['progress']['completed_steps']}/{len(BUNDLE_STEPS)} steps done at response time")
+    if bundle["status"] == "failed":
+        return JSONResponse(status_code=502, content=bundle)
+    return JSONResponse(status_code=202, content=bundle)
+
+
+@app.get("/api/experience-bundle/{bundle_id}")
+async def get_experience_bundle_endpoint(bundle_id: str):
+    """Per-step progress of a bundle; "completed" once the slowest step is done, with every asset URL."""
+    return await load_experience_bundle(bundle_id, refresh=True)
 
 
 @app.get("/api/proxy-image")
@@ -864,9 +1899,12 @@ async def proxy_image(url: str, request: Request):
                 print(f"Added Authorization header for Akool API URL")
             
             try:
-                response = await client.get(decoded_url, headers=headers)
+                response = await open_upstream(client, decoded_url, headers)
+                if response.is_error:
+                    await response.aread() # The error body is reported below
                 response.raise_for_status()
             except httpx.HTTPStatusError as e:
+                await response.aclose()
                 print(f"HTTP error while fetching image: {e.response.status_code} - {e.response.text}")
                 if e.response.status_code == 403:
                     raise HTTPException(status_code=403, detail="Access denied to image resource. Please try again.")
@@ -887,6 +1925,8 @@ async def proxy_image(url: str, request: Request):
             except Exception as e:
                 print(f"Error reading image data: {str(e)}")
                 raise HTTPException(status_code=500, detail="Error reading image data")
+            finally:
+                await response.aclose()
             
             # Add CORS and caching headers
             headers = {
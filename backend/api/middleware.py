@@ -0,0 +1,198 @@
+import contextlib
+import contextvars
+import json
+import re
+import time
+import traceback
+from typing import Dict, List, Optional
+
+# Pure ASGI middleware: unlike @app.middleware("http") (BaseHTTPMiddleware) these don't wrap
+# every response in an extra task + memory stream, so streaming bodies pass straight through.
+
+# Per-request stage durations: stage name -> [total ms, count]
+_request_timings: contextvars.ContextVar[Optional[Dict[str, List[float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+STAGE_DESCRIPTIONS = {
+    "upload": "S3 upload",
+    "detect": "Akool face detect",
+    "vendor": "Vendor API call",
+    "proxy": "Upstream media fetch",
+}
+
+
+@contextlib.contextmanager
+def stage_timer(stage: str):
+    """Records how long the wrapped block took under `stage` in the Server-Timing header."""
+    timings = _request_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry = timings.setdefault(stage, [0.0, 0])
+        entry[0] += (time.perf_counter() - start) * 1000
+        entry[1] += 1
+
+
+def current_stage_timings() -> Dict[str, float]:
+    """Stage durations (ms) recorded so far in the current request."""
+    timings = _request_timings.get() or {}
+    return {stage: round(duration_ms, 1) for stage, (duration_ms, _) in timings.items()}
+
+
+def _server_timing_value(timings: Dict[str, List[float]], total_ms: float) -> str:
+    metrics = []
+    for stage, (duration_ms, count) in timings.items():
+        description = STAGE_DESCRIPTIONS.get(stage, stage)
+        if count > 1:
+            description += f" x{count}"
+        metrics.append(f'{stage};dur={duration_ms:.1f};desc="{description}"')
+    metrics.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(metrics)
+
+
+class ServerTimingMiddleware:
+    """Adds a Server-Timing header with the stages recorded by stage_timer() plus the total."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, List[float]] = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - start) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing_value(timings, total_ms).encode("latin-1")))
+                # Lets the frontend read the breakdown through the Resource Timing API
+                headers.append((b"timing-allow-origin", b"*"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+
+
+class CORSMiddleware:
+    """CORS for the configured origins; preflight requests are answered here without routing."""
+
+    def __init__(self, app, allow_origins: List[str], allow_methods: str = "GET, POST, PUT, DELETE, OPTIONS", max_age: int = 3600):
+        self.app = app
+        self.exact_origins = {origin for origin in allow_origins if "*" not in origin}
+        # "*" in an entry (e.g. "https://my-app-*-team.vercel.app") matches within one hostname label,
+        # never across dots, so a pattern can't be satisfied by some other subdomain
+        self.origin_patterns = [
+            re.compile("[a-z0-9-]+".join(re.escape(part) for part in origin.split("*")))
+            for origin in allow_origins if "*" in origin
+        ]
+        self.allow_methods = allow_methods.encode("latin-1")
+        self.max_age = str(max_age).encode("latin-1")
+
+    def is_allowed_origin(self, origin: str) -> bool:
+        if origin in self.exact_origins:
+            return True
+        return any(pattern.fullmatch(origin) for pattern in self.origin_patterns)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope["headers"])
+        origin = request_headers.get(b"origin", b"").decode("latin-1")
+
+        if scope["method"] == "OPTIONS":
+            await self.preflight_response(origin, request_headers, send)
+            return
+
+        if not origin or not self.is_allowed_origin(origin):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                # Credentialed requests need the exact origin, so replace any "*" set by the handler
+                headers = [
+                    (name, value) for name, value in message.get("headers", [])
+                    if name.lower() not in (b"access-control-allow-origin", b"access-control-allow-credentials")
+                ]
+                headers.extend([
+                    (b"access-control-allow-origin", origin.encode("latin-1")),
+                    (b"access-control-allow-credentials", b"true"),
+                    (b"vary", b"Origin"),
+                ])
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def preflight_response(self, origin: str, request_headers: Dict[bytes, bytes], send):
+        if origin and not self.is_allowed_origin(origin):
+            body = b"Disallowed CORS origin"
+            await send({"type": "http.response.start", "status": 400, "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        requested_headers = request_headers.get(b"access-control-request-headers", b"Content-Type, Authorization")
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"access-control-allow-origin", origin.encode("latin-1") if origin else b"*"),
+            (b"access-control-allow-methods", self.allow_methods),
+            (b"access-control-allow-headers", requested_headers),
+            (b"access-control-allow-credentials", b"true"),
+            (b"access-control-max-age", self.max_age),
+            (b"vary", b"Origin"),
+            (b"content-length", b"0"),
+        ]})
+        await send({"type": "http.response.body", "body": b""})
+
+
+class ErrorHandlingMiddleware:
+    """Turns unhandled exceptions into a JSON 500 (HTTPExceptions are handled by FastAPI before this)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_tracking_start(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_tracking_start)
+        except Exception as e:
+            print(f"Unhandled error: {str(e)}")
+            print("Traceback:")
+            print(traceback.format_exc())
+            if response_started:
+                # Headers are already on the wire (e.g. a failing stream); nothing sane left to send
+                raise
+            body = json.dumps({"detail": f"Internal server error: {str(e)}"}).encode("utf-8")
+            await send({"type": "http.response.start", "status": 500, "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ]})
+            await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,135 @@
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import time
+from typing import Dict, List, Optional
+
+import anyio
+
+# --- Profiling Configuration ---
+# Off unless PROFILING_ENABLED is set; when off the middleware is never installed, so there is no cost.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")  # Signs X-Profile-Signature
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Profile 1 in N requests (0 = only signed ones)
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/aiawareness_profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))  # Sampling interval in seconds
+
+PROFILE_HEADER = b"x-profile-signature"
+PROFILE_SIGNATURE_MAX_AGE = 300  # seconds
+PROFILE_FILE_SUFFIX = ".speedscope.json"
+
+
+def sign_profile_request(secret: str, method: str, path: str, timestamp: Optional[int] = None) -> str:
+    """Builds an X-Profile-Signature value ("<timestamp>:<hmac>") for one method + path."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(secret.encode("utf-8"), f"{timestamp}:{method.upper()} {path}".encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{timestamp}:{digest}"
+
+
+def verify_profile_signature(secret: str, method: str, path: str, signature: str) -> bool:
+    if not secret:
+        return False
+    try:
+        timestamp = int(signature.split(":", 1)[0])
+    except ValueError:
+        return False
+    if abs(time.time() - timestamp) > PROFILE_SIGNATURE_MAX_AGE:
+        return False
+    return hmac.compare_digest(sign_profile_request(secret, method, path, timestamp), signature)
+
+
+def list_profiles() -> List[Dict[str, object]]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(PROFILE_DIR):
+        if entry.is_file() and entry.name.endswith(PROFILE_FILE_SUFFIX):
+            stat = entry.stat()
+            profiles.append({"name": entry.name, "size": stat.st_size, "created_at": stat.st_mtime})
+    return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Resolves a listed profile name to its file, refusing anything outside PROFILE_DIR."""
+    if os.path.basename(name) != name or not name.endswith(PROFILE_FILE_SUFFIX):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def _prune_profiles():
+    for profile in list_profiles()[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, profile["name"]))
+        except OSError:
+            pass
+
+
+def _write_profile(profiler, method: str, path: str, duration_ms: float) -> str:
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-")[:60] or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{method}_{slug}_{duration_ms:.0f}ms_{os.getpid()}{PROFILE_FILE_SUFFIX}"
+    with open(os.path.join(PROFILE_DIR, name), "w") as f:
+        f.write(profiler.output(renderer=SpeedscopeRenderer()))
+    _prune_profiles()
+    return name
+
+
+class ProfilingMiddleware:
+    """Records a wall-clock stack profile (await time included) of signed or sampled requests."""
+
+    def __init__(self, app, secret: str = PROFILE_SECRET, sample_rate: int = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.secret = secret
+        self.sample_rate = sample_rate
+        try:
+            import pyinstrument  # noqa: F401
+            self.available = True
+        except ImportError:
+            print("Warning: PROFILING_ENABLED is set but pyinstrument is not installed; requests will not be profiled.")
+            self.available = False
+
+    def should_profile(self, scope) -> bool:
+        if not self.available:
+            return False
+        signature = dict(scope["headers"]).get(PROFILE_HEADER)
+        if signature is not None:
+            return verify_profile_signature(self.secret, scope["method"], scope["path"], signature.decode("latin-1"))
+        return self.sample_rate > 0 and random.randrange(self.sample_rate) == 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        from pyinstrument import Profiler
+
+        # async_mode="enabled" attributes time spent awaiting to the awaiting frame
+        profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            duration_ms = (time.perf_counter() - start) * 1000
+            try:
+                name = await anyio.to_thread.run_sync(_write_profile, profiler, scope["method"], scope["path"], duration_ms)
+                print(f"[PROFILER] {scope['method']} {scope['path']} took {duration_ms:.0f} ms, profile saved as {name}")
+            except Exception as e:
+                print(f"[PROFILER] Failed to save profile for {scope['path']}: {e}")
+
+
+if __name__ == "__main__":
+    # Prints a header for profiling one request, e.g.:
+    #   PROFILE_SECRET=... python -m api.profiling POST /api/initiate-faceswap
+    if len(sys.argv) != 3 or not PROFILE_SECRET:
+        print("Usage: PROFILE_SECRET=<secret> python -m api.profiling <METHOD> <PATH>")
+        sys.exit(1)
+    print(f"X-Profile-Signature: {sign_profile_request(PROFILE_SECRET, sys.argv[1], sys.argv[2])}")
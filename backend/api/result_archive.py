@@ -0,0 +1,113 @@
+import functools
+import mimetypes
+import os
+import urllib.parse
+from typing import Dict, Optional
+
+import anyio
+import httpx
+
+from .clients import get_s3_client
+
+# S3 requires every multipart part except the last to be at least 5 MB
+ARCHIVE_PART_SIZE = int(os.getenv("RESULT_ARCHIVE_PART_SIZE", str(8 * 1024 * 1024)))
+ARCHIVE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Optional CDN in front of the bucket, e.g. https://media.example.com
+ARCHIVE_PUBLIC_BASE_URL = os.getenv("RESULT_ARCHIVE_PUBLIC_BASE_URL")
+
+
+def archived_object_name(task_id: str, source_url: str, kind: str) -> str:
+    path = urllib.parse.urlparse(source_url).path
+    extension = os.path.splitext(path)[1].lower()
+    if not extension:
+        extension = ".mp4" if kind == "video" else ".png"
+    return f"faceswap_results/{task_id}{extension}"
+
+
+def public_object_url(bucket_name: str, region: str, object_name: str) -> str:
+    if ARCHIVE_PUBLIC_BASE_URL:
+        return f"{ARCHIVE_PUBLIC_BASE_URL.rstrip('/')}/{object_name}"
+    return f"https://{bucket_name}.s3.{region}.amazonaws.com/{object_name}"
+
+
+def _content_type_for(object_name: str, upstream_content_type: Optional[str]) -> str:
+    # Akool's CDN sometimes labels media as application/octet-stream, which browsers won't play inline
+    if upstream_content_type and not upstream_content_type.startswith(("application/octet-stream", "binary/")):
+        return upstream_content_type
+    return mimetypes.guess_type(object_name)[0] or "application/octet-stream"
+
+
+async def archive_url_to_s3(
+    source_url: str,
+    bucket_name: str,
+    region: str,
+    object_name: str,
+    request_headers: Optional[Dict[str, str]] = None,
+) -> Dict[str, object]:
+    """Streams source_url into S3 (multipart for large bodies) and returns the stable public URL.
+
+    Only one part is buffered in memory at a time, so large videos don't blow the function's memory.
+    """
+    s3_client = get_s3_client()
+    if not s3_client:
+        raise RuntimeError("S3 client not initialized.")
+
+    def s3_call(method, **kwargs):
+        # boto3 is blocking; run each call on a worker thread
+        return anyio.to_thread.run_sync(functools.partial(getattr(s3_client, method), **kwargs))
+
+    upload_id = None
+    parts = []
+    total_bytes = 0
+    async with httpx.AsyncClient(follow_redirects=True, timeout=60.0) as client:
+        async with client.stream("GET", source_url, headers=request_headers or {}) as response:
+            response.raise_for_status()
+            content_type = _content_type_for(object_name, response.headers.get("Content-Type"))
+            object_args = {
+                "Bucket": bucket_name,
+                "Key": object_name,
+                "ACL": "public-read",
+                "ContentType": content_type,
+                "CacheControl": ARCHIVE_CACHE_CONTROL,
+            }
+            buffer = bytearray()
+
+            async def flush_part():
+                part_number = len(parts) + 1
+                result = await s3_call(
+                    "upload_part", Bucket=bucket_name, Key=object_name,
+                    UploadId=upload_id, PartNumber=part_number, Body=bytes(buffer)
+                )
+                parts.append({"ETag": result["ETag"], "PartNumber": part_number})
+
+            try:
+                async for chunk in response.aiter_bytes():
+                    buffer.extend(chunk)
+                    total_bytes += len(chunk)
+                    if len(buffer) >= ARCHIVE_PART_SIZE:
+                        if upload_id is None:
+                            upload_id = (await s3_call("create_multipart_upload", **object_args))["UploadId"]
+                        await flush_part()
+                        buffer = bytearray()
+
+                if upload_id is None:
+                    # Small result (typical for images): a single PUT is cheaper than multipart
+                    await s3_call("put_object", Body=bytes(buffer), **object_args)
+                else:
+                    if buffer:
+                        await flush_part()
+                    await s3_call(
+                        "complete_multipart_upload", Bucket=bucket_name, Key=object_name,
+                        UploadId=upload_id, MultipartUpload={"Parts": parts}
+                    )
+            except BaseException:
+                if upload_id is not None:
+                    try:
+                        await s3_call("abort_multipart_upload", Bucket=bucket_name, Key=object_name, UploadId=upload_id)
+                    except Exception as e:
+                        print(f"[RESULT_ARCHIVE] Failed to abort multipart upload {upload_id}: {e}")
+                raise
+
+    url = public_object_url(bucket_name, region, object_name)
+    print(f"[RESULT_ARCHIVE] Archived {total_bytes} bytes from {source_url} to {url} ({len(parts) or 1} part(s))")
+    return {"url": url, "size": total_bytes, "content_type": content_type}
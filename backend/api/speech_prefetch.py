@@ -0,0 +1,95 @@
+import asyncio
+import base64
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from .state import get_state
+
+# Synthesizes (text, voice_id, model_id) into MP3 bytes
+SynthesizeFn = Callable[[str, str, str], Awaitable[bytes]]
+
+
+class SpeechPrefetchStore:
+    """Short-lived per-session store of speech synthesized ahead of time.
+
+    In-flight syntheses live in this process as asyncio tasks; finished audio is also
+    written to the shared state backend so another worker can serve it.
+    """
+
+    def __init__(self, synthesize: SynthesizeFn, max_concurrency: int, ttl_seconds: int):
+        self._synthesize = synthesize
+        self._max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.ttl_seconds = ttl_seconds
+        self._sessions: Dict[str, Dict[str, asyncio.Task]] = {}
+        self._expires_at: Dict[str, float] = {}
+
+    @staticmethod
+    def cache_key(text: str, voice_id: str, model_id: str) -> str:
+        return hashlib.sha256(f"{voice_id}\0{model_id}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+    def _state_key(self, session_id: str, key: str) -> str:
+        return f"speech_prefetch:{session_id}:{key}"
+
+    def schedule(self, session_id: str, text: str, voice_id: str, model_id: str) -> str:
+        """Starts synthesizing text in the background (once per session) and returns its cache key."""
+        self._expire_sessions()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        key = self.cache_key(text, voice_id, model_id)
+        tasks = self._sessions.setdefault(session_id, {})
+        self._expires_at[session_id] = time.monotonic() + self.ttl_seconds
+        if key not in tasks:
+            tasks[key] = asyncio.create_task(self._run(session_id, key, text, voice_id, model_id))
+        return key
+
+    async def _run(self, session_id: str, key: str, text: str, voice_id: str, model_id: str) -> bytes:
+        async with self._semaphore:
+            audio = await self._synthesize(text, voice_id, model_id)
+        print(f"[SPEECH_PREFETCH] Session {session_id}: prefetched {len(audio)} bytes for '{text[:30]}...'")
+        try:
+            await get_state().set(
+                self._state_key(session_id, key),
+                base64.b64encode(audio).decode("ascii"),
+                ttl=self.ttl_seconds,
+            )
+        except Exception as e:
+            print(f"[SPEECH_PREFETCH] Could not share prefetched audio for session {session_id}: {e}")
+        return audio
+
+    async def get(self, session_id: str, text: str, voice_id: str, model_id: str) -> Optional[bytes]:
+        """Returns prefetched audio, waiting for an in-flight synthesis if there is one."""
+        key = self.cache_key(text, voice_id, model_id)
+        task = self._sessions.get(session_id, {}).get(key)
+        if task is not None:
+            try:
+                return await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise  # The request itself was cancelled, not the prefetch
+            except Exception as e:
+                print(f"[SPEECH_PREFETCH] Prefetch failed for session {session_id}, synthesizing on demand: {e}")
+            return None
+
+        stored = await get_state().get(self._state_key(session_id, key))
+        return base64.b64decode(stored) if stored else None
+
+    async def cancel_session(self, session_id: str) -> int:
+        """Cancels unfinished prefetches for a session and drops its audio. Returns the number cancelled."""
+        tasks = self._sessions.pop(session_id, {})
+        self._expires_at.pop(session_id, None)
+        cancelled = 0
+        for key, task in tasks.items():
+            if not task.done():
+                task.cancel()
+                cancelled += 1
+            await get_state().delete(self._state_key(session_id, key))
+        return cancelled
+
+    def _expire_sessions(self):
+        now = time.monotonic()
+        for session_id in [sid for sid, expires_at in self._expires_at.items() if expires_at <= now]:
+            for task in self._sessions.pop(session_id, {}).values():
+                task.cancel()
+            del self._expires_at[session_id]
@@ -0,0 +1,422 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import Optional, Dict, List, Any, AsyncIterator
+
+# --- Shared State Configuration ---
+# STATE_BACKEND selects where caches, task tracking and rate-limit counters live:
+#   "memory" - per-process dicts (default; fine for a single worker / local dev)
+#   "sqlite" - a WAL-mode SQLite file shared by all workers on the same host
+#   "redis"  - any Redis-protocol server (Redis, Valkey, KeyDB, ...) shared across instances
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "/tmp/aiawareness_state.db")
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "aiawareness:")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+PUBSUB_POLL_INTERVAL = 0.25  # seconds; only used by the SQLite backend
+# Expired keys that are never read again (old rate-limit windows, cached audio) are purged on
+# write, at most this often (seconds); the Redis backend leaves this to the server
+EXPIRED_SWEEP_INTERVAL = 60.0
+
+
+class StateBackend:
+    """Key/value with TTL, atomic counters and pub/sub. Values are strings."""
+
+    name = "base"
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        """Stores value only if key is missing (or expired). Returns True if it was stored."""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Atomically adds amount to a counter. ttl is applied only when the counter is created."""
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: str) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, channel: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    # JSON convenience wrappers used by the endpoints
+    async def get_json(self, key: str) -> Optional[Any]:
+        raw = await self.get(key)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            print(f"[STATE] Ignoring non-JSON value stored at {key}")
+            return None
+
+    async def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self.set(key, json.dumps(value), ttl)
+
+    async def set_json_if_absent(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return await self.set_if_absent(key, json.dumps(value), ttl)
+
+
+# --- In-Memory Backend ---
+class MemoryStateBackend(StateBackend):
+    name = "memory"
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}  # key -> (value, expires_at or None)
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def _live(self, key: str) -> Optional[tuple]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def _sweep_expired(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + EXPIRED_SWEEP_INTERVAL
+        expired = [key for key, (_, expires_at) in self._data.items() if expires_at is not None and expires_at <= now]
+        for key in expired:
+            del self._data[key]
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        return time.monotonic() + ttl if ttl else None
+
+    async def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._sweep_expired()
+            self._data[key] = (value, self._expiry(ttl))
+
+    async def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            self._sweep_expired()
+            if self._live(key) is not None:
+                return False
+            self._data[key] = (value, self._expiry(ttl))
+            return True
+
+    async def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        with self._lock:
+            self._sweep_expired()
+            entry = self._live(key)
+            if entry is None:
+                value, expires_at = amount, self._expiry(ttl)
+            else:
+                value, expires_at = int(entry[0]) + amount, entry[1]
+            self._data[key] = (str(value), expires_at)
+            return value
+
+    async def publish(self, channel: str, message: str) -> None:
+        for queue in list(self._subscribers.get(channel, [])):
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[channel].remove(queue)
+
+
+# --- SQLite (WAL) Backend ---
+class SQLiteStateBackend(StateBackend):
+    """Shares state between uvicorn workers on one host through a WAL-mode SQLite file."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._next_sweep = 0.0
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS pubsub (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                message TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pubsub_channel_id ON pubsub (channel, id);
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads, and asyncio.to_thread
+        # may run us on any thread of the default executor.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _run(self, fn, *args):
+        return asyncio.to_thread(fn, *args)
+
+    def _sweep_expired(self, conn: sqlite3.Connection, now: float):
+        # Racing workers may both sweep; the DELETE is idempotent
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + EXPIRED_SWEEP_INTERVAL
+        conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def _get_sync(self, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_sync(self, key: str, value: str, ttl: Optional[float]) -> None:
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        conn = self._conn()
+        self._sweep_expired(conn, now)
+        conn.execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, expires_at),
+        )
+
+    def _set_if_absent_sync(self, key: str, value: str, ttl: Optional[float]) -> bool:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl if ttl else None),
+            )
+            conn.execute("COMMIT")
+            return cursor.rowcount == 1
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _delete_sync(self, key: str) -> None:
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def _incr_sync(self, key: str, amount: int, ttl: Optional[float]) -> int:
+        now = time.time()
+        conn = self._conn()
+        self._sweep_expired(conn, now)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?", (key, now))
+            conn.execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(kv.value AS INTEGER) + ?",
+                (key, str(amount), now + ttl if ttl else None, amount),
+            )
+            value = int(conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()[0])
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _publish_sync(self, channel: str, message: str) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("INSERT INTO pubsub (channel, message, created_at) VALUES (?, ?, ?)", (channel, message, now))
+        # Messages are only kept long enough for polling subscribers to pick them up
+        conn.execute("DELETE FROM pubsub WHERE created_at < ?", (now - 60,))
+
+    def _poll_sync(self, channel: str, after_id: int) -> List[tuple]:
+        return self._conn().execute(
+            "SELECT id, message FROM pubsub WHERE channel = ? AND id > ? ORDER BY id",
+            (channel, after_id),
+        ).fetchall()
+
+    def _last_id_sync(self) -> int:
+        row = self._conn().execute("SELECT MAX(id) FROM pubsub").fetchone()
+        return row[0] or 0
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._run(self._get_sync, key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self._run(self._set_sync, key, value, ttl)
+
+    async def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return await self._run(self._set_if_absent_sync, key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._run(self._delete_sync, key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return await self._run(self._incr_sync, key, amount, ttl)
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self._run(self._publish_sync, channel, message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        last_id = await self._run(self._last_id_sync)
+        while True:
+            rows = await self._run(self._poll_sync, channel, last_id)
+            for row_id, message in rows:
+                last_id = row_id
+                yield message
+            if not rows:
+                await asyncio.sleep(PUBSUB_POLL_INTERVAL)
+
+
+# --- Redis-Protocol Backend ---
+class RedisStateBackend(StateBackend):
+    """Works against Redis or any RESP-compatible server (Valkey, KeyDB, a local redis-server)."""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis_asyncio  # Deferred: only needed when STATE_BACKEND=redis
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self._redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return bool(await self._redis.set(key, value, px=int(ttl * 1000) if ttl else None, nx=True))
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        value = int(await self._redis.incrby(key, amount))
+        if ttl and value == amount:
+            # First increment created the key; start its expiry window now
+            await self._redis.pexpire(key, int(ttl * 1000))
+        return value
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self._redis.publish(channel, message)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(channel)
+        try:
+            async for item in pubsub.listen():
+                if item.get("type") == "message":
+                    yield item["data"]
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class _PrefixedStateBackend(StateBackend):
+    """Namespaces every key and channel so several deployments can share one server."""
+
+    def __init__(self, inner: StateBackend, prefix: str):
+        self.inner = inner
+        self.prefix = prefix
+        self.name = inner.name
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.inner.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await self.inner.set(self.prefix + key, value, ttl)
+
+    async def set_if_absent(self, key: str, value: str, ttl: Optional[float] = None) -> bool:
+        return await self.inner.set_if_absent(self.prefix + key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.inner.delete(self.prefix + key)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        return await self.inner.incr(self.prefix + key, amount, ttl)
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self.inner.publish(self.prefix + channel, message)
+
+    def subscribe(self, channel: str) -> AsyncIterator[str]:
+        return self.inner.subscribe(self.prefix + channel)
+
+    async def close(self) -> None:
+        await self.inner.close()
+
+
+# --- Backend Selection ---
+_state: Optional[StateBackend] = None
+_state_lock = threading.Lock()
+
+
+def create_state_backend(kind: str = STATE_BACKEND) -> StateBackend:
+    if kind == "sqlite":
+        inner: StateBackend = SQLiteStateBackend(STATE_SQLITE_PATH)
+    elif kind == "redis":
+        inner = RedisStateBackend(REDIS_URL)
+    else:
+        if kind != "memory":
+            print(f"Warning: Unknown STATE_BACKEND '{kind}', falling back to in-memory state.")
+        inner = MemoryStateBackend()
+    return _PrefixedStateBackend(inner, STATE_KEY_PREFIX)
+
+
+def get_state() -> StateBackend:
+    """Returns the process-wide state backend, creating it on first use."""
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                try:
+                    _state = create_state_backend()
+                except Exception as e:
+                    print(f"Error initializing '{STATE_BACKEND}' state backend: {e}. Falling back to in-memory state.")
+                    _state = create_state_backend("memory")
+                print(f"Shared state backend initialized: {_state.name}")
+    return _state
+
+
+async def check_rate_limit(bucket: str, limit: int, window_seconds: int) -> bool:
+    """Fixed-window limiter shared across workers. Returns False once `limit` is exceeded."""
+    if limit <= 0:
+        return True
+    window = int(time.time() // window_seconds)
+    count = await get_state().incr(f"ratelimit:{bucket}:{window}", 1, ttl=window_seconds)
+    return count <= limit
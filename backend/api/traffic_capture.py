@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+from typing import Optional
+
+import anyio
+
+from .middleware import current_stage_timings
+
+# --- Traffic Capture Configuration ---
+# Off unless TRAFFIC_CAPTURE_ENABLED is set. Traces feed benchmarks/replay.py; they hold routes,
+# sizes and timings, and a salted hash in place of any payload or user-supplied value.
+TRAFFIC_CAPTURE_ENABLED = os.getenv("TRAFFIC_CAPTURE_ENABLED", "false").lower() in ("1", "true", "yes")
+TRAFFIC_CAPTURE_PATH = os.getenv("TRAFFIC_CAPTURE_PATH", "/tmp/aiawareness_traffic.jsonl")
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "1.0"))  # Fraction of requests
+TRAFFIC_CAPTURE_MAX_BYTES = int(os.getenv("TRAFFIC_CAPTURE_MAX_BYTES", str(50 * 1024 * 1024)))
+# Without a fixed salt, hashes only match within one process (enough to spot repeats in a session)
+TRAFFIC_CAPTURE_SALT = os.getenv("TRAFFIC_CAPTURE_SALT") or os.urandom(16).hex()
+
+JSON_BODY_MAX_BYTES = 64 * 1024  # Larger JSON bodies are recorded by size only
+# Values kept verbatim: they pick a scenario or output format and never identify the user
+SAFE_VALUE_KEYS = frozenset({"section", "scenario", "voice_scenario", "gender", "mode", "face_enhance", "model_id", "chunked", "output_format"})
+
+_write_lock = threading.Lock()
+
+
+def salted_hash(value) -> str:
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return hashlib.sha256(TRAFFIC_CAPTURE_SALT.encode("ascii") + value).hexdigest()[:16]
+
+
+def sanitize_value(key: Optional[str], value):
+    """{"value": v} for allow-listed keys, otherwise just the shape: string length or type."""
+    if key in SAFE_VALUE_KEYS and isinstance(value, (str, int, float, bool)):
+        return {"value": value}
+    if isinstance(value, str):
+        return {"length": len(value), "hash": salted_hash(value)}
+    if isinstance(value, dict):
+        return {"object": {k: sanitize_value(k, v) for k, v in value.items()}}
+    if isinstance(value, list):
+        return {"list": [sanitize_value(key, item) for item in value[:20]], "count": len(value)}
+    return {"type": type(value).__name__}
+
+
+def _sanitize_json_body(body: bytes):
+    try:
+        return sanitize_value(None, json.loads(body))
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _write_trace(path: str, line: str):
+    with _write_lock:
+        try:
+            if os.path.getsize(path) >= TRAFFIC_CAPTURE_MAX_BYTES:
+                return
+        except OSError:
+            pass  # First trace: the file doesn't exist yet
+        with open(path, "a") as f:
+            f.write(line + "\n")
+
+
+class TrafficCaptureMiddleware:
+    """Appends one sanitized JSON line per (sampled) HTTP request to TRAFFIC_CAPTURE_PATH."""
+
+    def __init__(self, app, path: str = TRAFFIC_CAPTURE_PATH, sample_rate: float = TRAFFIC_CAPTURE_SAMPLE_RATE):
+        self.app = app
+        self.path = path
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip().lower()
+        body_hash = hashlib.sha256(TRAFFIC_CAPTURE_SALT.encode("ascii"))
+        json_body = bytearray() if content_type == "application/json" else None
+        request_info = {"content_type": content_type or None, "size": 0}
+        response_info = {"status": None, "size": 0, "content_type": None, "ttfb_ms": None}
+        wall_start = time.time()
+        start = time.perf_counter()
+
+        async def capture_receive():
+            nonlocal json_body
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                request_info["size"] += len(chunk)
+                body_hash.update(chunk)
+                if json_body is not None:
+                    json_body.extend(chunk)
+                    if len(json_body) > JSON_BODY_MAX_BYTES:
+                        json_body = None
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response_info["status"] = message["status"]
+                response_info["ttfb_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-type":
+                        response_info["content_type"] = value.decode("latin-1").split(";")[0]
+            elif message["type"] == "http.response.body":
+                response_info["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            duration_ms = round((time.perf_counter() - start) * 1000, 1)
+            try:
+                await self.record(scope, headers, request_info, body_hash.hexdigest()[:16], json_body, response_info, wall_start, duration_ms)
+            except Exception as e:
+                print(f"[TRAFFIC_CAPTURE] Failed to record {scope['path']}: {e}")
+
+    async def record(self, scope, headers, request_info, body_hash, json_body, response_info, wall_start, duration_ms):
+        route = scope.get("route")
+        forwarded_for = headers.get(b"x-forwarded-for", b"").decode("latin-1").split(",")[0].strip()
+        client = forwarded_for or (scope.get("client") or ("unknown",))[0]
+        request_info["hash"] = body_hash
+        if json_body is not None:
+            request_info["json"] = _sanitize_json_body(bytes(json_body))
+        state = scope.get("state") or {}
+        if state.get("uploads"):
+            request_info["uploads"] = {
+                field: {"hash": salted_hash(upload["sha256"]), "size": upload["size"], "content_type": upload["content_type"]}
+                for field, upload in state["uploads"].items()
+            }
+        if state.get("form_fields") is not None:
+            request_info["form"] = {key: sanitize_value(key, value) for key, value in state["form_fields"].items()}
+
+        trace = {
+            "ts": round(wall_start, 3),
+            "method": scope["method"],
+            # The route template keeps IDs out of the route name; their values are hashed below
+            "route": getattr(route, "path", None) or scope["path"],
+            "path_params": {key: salted_hash(str(value)) for key, value in (scope.get("path_params") or {}).items()},
+            "query": {
+                key: sanitize_value(key, value)
+                for key, value in urllib.parse.parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+            },
+            "accept": headers.get(b"accept", b"").decode("latin-1") or None,
+            "client": salted_hash(client),
+            "request": request_info,
+            "response": response_info,
+            "duration_ms": duration_ms,
+            "stages": current_stage_timings(),
+        }
+        await anyio.to_thread.run_sync(_write_trace, self.path, json.dumps(trace, ensure_ascii=False))
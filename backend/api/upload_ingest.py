@@ -0,0 +1,320 @@
+import hashlib
+import os
+import tempfile
+import time
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, Request, UploadFile
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.datastructures import Headers
+
+from .state import get_state
+
+# --- Upload Ingestion Configuration ---
+# Multipart bodies are parsed here as they stream in, instead of letting Starlette spool the whole
+# body before the handler runs: oversized or mistyped uploads are rejected after the first chunk.
+UPLOAD_MAX_IMAGE_BYTES = int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_MAX_AUDIO_BYTES = int(os.getenv("UPLOAD_MAX_AUDIO_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_SPOOL_THRESHOLD_BYTES = int(os.getenv("UPLOAD_SPOOL_THRESHOLD_BYTES", str(1024 * 1024)))  # Larger files go to /tmp
+MAX_FIELD_BYTES = 64 * 1024  # Plain form fields (section, targets JSON, ...)
+MAX_FORM_OVERHEAD_BYTES = 256 * 1024  # Boundaries, part headers and fields on top of the file itself
+SNIFF_BYTES = 16
+INGEST_STATS_TTL_SECONDS = 7 * 24 * 3600
+
+
+class UploadPolicy:
+    def __init__(self, name: str, file_field: str, max_bytes: int, allowed_types: FrozenSet[str]):
+        self.name = name
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.allowed_types = allowed_types
+
+
+IMAGE_UPLOAD_POLICY = UploadPolicy(
+    "image", "user_image", UPLOAD_MAX_IMAGE_BYTES, frozenset({"image/jpeg", "image/png", "image/webp"})
+)
+# Browsers' MediaRecorder produces webm/ogg (Chrome, Firefox) or an mp4 container (Safari)
+AUDIO_UPLOAD_POLICY = UploadPolicy(
+    "audio", "audio_file", UPLOAD_MAX_AUDIO_BYTES,
+    frozenset({"audio/webm", "audio/ogg", "audio/wav", "audio/mpeg", "audio/flac", "audio/mp4", "video/mp4"})
+)
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Identifies the upload from its magic bytes; the client-declared content type is not trusted."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"RIFF") and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "audio/webm"  # Matroska/WebM; only the audio policy accepts it
+    if head.startswith(b"OggS"):
+        return "audio/ogg"
+    if head.startswith(b"fLaC"):
+        return "audio/flac"
+    if head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "audio/mpeg"
+    if head[4:8] == b"ftyp":
+        return "audio/mp4" if head[8:12] == b"M4A " else "video/mp4"
+    return None
+
+
+class IngestedUpload(UploadFile):
+    """An UploadFile whose content type was sniffed and whose SHA-256 was computed while streaming."""
+
+    def __init__(self, file, *, filename: Optional[str], content_type: str, sha256: str, size: int):
+        super().__init__(file, size=size, filename=filename, headers=Headers({"content-type": content_type}))
+        self.sha256 = sha256
+
+
+class IngestedForm:
+    def __init__(self, fields: Dict[str, str], files: Dict[str, IngestedUpload]):
+        self.fields = fields
+        self.files = files
+
+    def field(self, name: str, default: Optional[str] = None) -> str:
+        value = self.fields.get(name, default)
+        if value is None:
+            raise HTTPException(status_code=422, detail=f"Missing form field: {name}")
+        return value
+
+    def file(self, name: str) -> IngestedUpload:
+        upload = self.files.get(name)
+        if upload is None:
+            raise HTTPException(status_code=422, detail=f"Missing file field: {name}")
+        return upload
+
+    def detach(self, name: str) -> IngestedUpload:
+        """Hands a file to work that outlives the request; the caller closes it instead of the dependency."""
+        upload = self.file(name)
+        del self.files[name]
+        return upload
+
+    async def close(self):
+        for upload in self.files.values():
+            await upload.close()
+
+
+async def record_ingest(policy: UploadPolicy, accepted: bool, received_bytes: int, elapsed_seconds: float):
+    state = get_state()
+    prefix = f"upload_ingest:{policy.name}"
+    try:
+        if accepted:
+            await state.incr(f"{prefix}:accepted", ttl=INGEST_STATS_TTL_SECONDS)
+            await state.incr(f"{prefix}:accepted_bytes", received_bytes, ttl=INGEST_STATS_TTL_SECONDS)
+            await state.incr(f"{prefix}:ingest_ms", int(elapsed_seconds * 1000), ttl=INGEST_STATS_TTL_SECONDS)
+        else:
+            await state.incr(f"{prefix}:rejected", ttl=INGEST_STATS_TTL_SECONDS)
+            await state.incr(f"{prefix}:rejected_bytes", received_bytes, ttl=INGEST_STATS_TTL_SECONDS)
+    except Exception as e:
+        print(f"[UPLOAD_INGEST] Failed to record ingestion stats: {e}")
+
+
+async def ingest_stats() -> Dict[str, Dict[str, float]]:
+    state = get_state()
+    stats = {}
+    for policy in (IMAGE_UPLOAD_POLICY, AUDIO_UPLOAD_POLICY):
+        prefix = f"upload_ingest:{policy.name}"
+        counters = {}
+        for counter in ("accepted", "accepted_bytes", "ingest_ms", "rejected", "rejected_bytes"):
+            counters[counter] = int(await state.get(f"{prefix}:{counter}") or 0)
+        # Includes the client's upload time, so this is what users actually get, not just our parsing speed
+        counters["throughput_mb_per_s"] = round(
+            counters["accepted_bytes"] / 1024 / 1024 / (counters["ingest_ms"] / 1000), 2
+        ) if counters["ingest_ms"] else 0.0
+        counters["max_bytes"] = policy.max_bytes
+        stats[policy.name] = counters
+    return stats
+
+
+class _StreamingMultipartIngest:
+    """Feeds request chunks through python-multipart and applies each file field's policy as it arrives."""
+
+    def __init__(self, policies: Tuple[UploadPolicy, ...]):
+        self.policies = {policy.file_field: policy for policy in policies}
+        self.policy = policies[0]  # The policy of the file being read (or last read)
+        # The parser callbacks are synchronous, so they only queue events; handle_events() processes them
+        self.events: List[Tuple[str, object]] = []
+        self.header_field = b""
+        self.header_value = b""
+        self.part_headers: Dict[bytes, bytes] = {}
+        self.part_name: Optional[str] = None
+        self.part_filename: Optional[str] = None
+        self.field_data = bytearray()
+        self.file = None
+        self.file_head = bytearray()
+        self.file_type: Optional[str] = None
+        self.file_hash = None
+        self.file_size = 0
+        self.fields: Dict[str, str] = {}
+        self.files: Dict[str, IngestedUpload] = {}
+
+    def callbacks(self):
+        def on_header_field(data: bytes, start: int, end: int):
+            self.header_field += data[start:end]
+
+        def on_header_value(data: bytes, start: int, end: int):
+            self.header_value += data[start:end]
+
+        def on_header_end():
+            self.part_headers[self.header_field.lower()] = self.header_value
+            self.header_field = b""
+            self.header_value = b""
+
+        def on_part_begin():
+            # A fresh dict per part: a queued "headers" event keeps its own part's headers
+            self.part_headers = {}
+
+        return {
+            "on_part_begin": on_part_begin,
+            "on_part_data": lambda data, start, end: self.events.append(("data", data[start:end])),
+            "on_part_end": lambda: self.events.append(("end", b"")),
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": lambda: self.events.append(("headers", self.part_headers)),
+        }
+
+    async def handle_events(self):
+        events, self.events = self.events, []
+        for event, data in events:
+            if event == "headers":
+                self.start_part(data)
+            elif event == "data":
+                await self.part_data(data)
+            elif event == "end":
+                await self.end_part()
+
+    def start_part(self, headers: Dict[bytes, bytes]):
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        self.part_name = options.get(b"name", b"").decode("utf-8", errors="replace")
+        filename = options.get(b"filename")
+        self.part_filename = filename.decode("utf-8", errors="replace") if filename is not None else None
+        self.field_data = bytearray()
+        if self.part_filename is None:
+            return
+        if self.part_name not in self.policies or self.part_name in self.files:
+            raise HTTPException(status_code=400, detail=f"Unexpected file field: {self.part_name}")
+        self.policy = self.policies[self.part_name]
+        self.file = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_THRESHOLD_BYTES)
+        self.file_head = bytearray()
+        self.file_type = None
+        self.file_hash = hashlib.sha256()
+        self.file_size = 0
+
+    async def part_data(self, data: bytes):
+        if self.file is None:
+            self.field_data.extend(data)
+            if len(self.field_data) > MAX_FIELD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Form field too large: {self.part_name}")
+            return
+
+        self.file_size += len(data)
+        if self.file_size > self.policy.max_bytes:
+            raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {self.policy.max_bytes // (1024 * 1024)} MB.")
+        self.file_hash.update(data)
+        if self.file_type is None:
+            # Hold back the first bytes until there are enough to identify the format
+            self.file_head.extend(data)
+            if len(self.file_head) < SNIFF_BYTES:
+                return
+            self.check_type()
+            data, self.file_head = bytes(self.file_head), bytearray()
+        await self.write_file(data)
+
+    def check_type(self):
+        self.file_type = sniff_content_type(bytes(self.file_head[:SNIFF_BYTES]))
+        if self.file_type not in self.policy.allowed_types:
+            raise HTTPException(
+                status_code=415,
+                detail=f"Unsupported file type. Allowed: {', '.join(sorted(self.policy.allowed_types))}."
+            )
+
+    async def write_file(self, data: bytes):
+        if self.file._rolled:
+            # Spilled to disk: don't block the event loop on the write
+            await anyio.to_thread.run_sync(self.file.write, data)
+        else:
+            self.file.write(data)
+
+    async def end_part(self):
+        if self.file is None:
+            self.fields[self.part_name] = self.field_data.decode("utf-8", errors="replace")
+            return
+        if self.file_type is None:
+            self.check_type()  # Files shorter than SNIFF_BYTES
+            await self.write_file(bytes(self.file_head))
+        self.file.seek(0)
+        self.files[self.part_name] = IngestedUpload(
+            self.file, filename=self.part_filename, content_type=self.file_type,
+            sha256=self.file_hash.hexdigest(), size=self.file_size
+        )
+        self.file = None
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        for upload in self.files.values():
+            upload.file.close()
+
+
+async def ingest_multipart(request: Request, *policies: UploadPolicy) -> IngestedForm:
+    """Parses a multipart body with one file field per policy (each optional; endpoints check presence)."""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type.lower() != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload.")
+
+    max_bytes = sum(policy.max_bytes for policy in policies)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MAX_FORM_OVERHEAD_BYTES:
+        # Rejected without reading a single body byte
+        await record_ingest(policies[0], False, 0, 0.0)
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_bytes // (1024 * 1024)} MB.")
+
+    ingest = _StreamingMultipartIngest(policies)
+    parser = MultipartParser(boundary, ingest.callbacks())
+    received = 0
+    start = time.perf_counter()
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            parser.write(chunk)
+            await ingest.handle_events()
+        parser.finalize()
+        await ingest.handle_events()
+    except BaseException as e:
+        ingest.close()
+        if isinstance(e, HTTPException):
+            print(f"[UPLOAD_INGEST] Rejected {ingest.policy.name} upload after {received} bytes: {e.detail}")
+            await record_ingest(ingest.policy, False, received, time.perf_counter() - start)
+        raise
+
+    elapsed = time.perf_counter() - start
+    # Read by the traffic capture middleware, which never sees the parsed parts itself
+    request.state.uploads = {
+        field: {"sha256": upload.sha256, "size": upload.size, "content_type": upload.content_type}
+        for field, upload in ingest.files.items()
+    }
+    request.state.form_fields = ingest.fields
+    for field, upload in ingest.files.items():
+        # Single-file forms count the whole body, as before; otherwise each file counts its own bytes
+        await record_ingest(ingest.policies[field], True, received if len(ingest.files) == 1 else upload.size, elapsed)
+    print(f"[UPLOAD_INGEST] {'+'.join(ingest.files) or 'no files'}: {received} bytes in {elapsed * 1000:.0f} ms")
+    return IngestedForm(ingest.fields, ingest.files)
+
+
+def upload_ingestion(*policies: UploadPolicy):
+    """FastAPI dependency that ingests the request body under `policies` and closes the files afterwards."""
+    async def dependency(request: Request):
+        form = await ingest_multipart(request, *policies)
+        try:
+            yield form
+        finally:
+            await form.close()
+    return dependency
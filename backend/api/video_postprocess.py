@@ -0,0 +1,131 @@
+import functools
+import os
+import shutil
+import subprocess
+import tempfile
+import urllib.parse
+from typing import Dict, Optional
+
+import anyio
+import httpx
+
+from .clients import get_s3_client
+from .result_archive import ARCHIVE_CACHE_CONTROL, public_object_url
+
+# --- Video Post-Processing Configuration ---
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+VIDEO_POSTPROCESS_ENABLED = os.getenv("VIDEO_POSTPROCESS_ENABLED", "true").lower() in ("1", "true", "yes")
+VIDEO_POSTPROCESS_WORKERS = int(os.getenv("VIDEO_POSTPROCESS_WORKERS", "2"))  # Videos processed at once
+VIDEO_MOBILE_RENDITION = os.getenv("VIDEO_MOBILE_RENDITION", "false").lower() in ("1", "true", "yes")
+VIDEO_MOBILE_HEIGHT = int(os.getenv("VIDEO_MOBILE_HEIGHT", "480"))
+VIDEO_MOBILE_BITRATE_KBPS = int(os.getenv("VIDEO_MOBILE_BITRATE_KBPS", "800"))
+VIDEO_POSTER_OFFSET = os.getenv("VIDEO_POSTER_OFFSET", "0.5")  # seconds into the video
+FFMPEG_TIMEOUT_SECONDS = 300
+
+OUTPUT_CONTENT_TYPES = {".mp4": "video/mp4", ".jpg": "image/jpeg"}
+
+_ffmpeg_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG_PATH) is not None
+
+
+def postprocess_enabled() -> bool:
+    return VIDEO_POSTPROCESS_ENABLED and ffmpeg_available()
+
+
+def _run_ffmpeg(*args: str):
+    subprocess.run(
+        [FFMPEG_PATH, "-hide_banner", "-loglevel", "error", "-y", *args],
+        check=True,
+        capture_output=True,
+        timeout=FFMPEG_TIMEOUT_SECONDS,
+    )
+
+
+def process_video_file(source_path: str, output_dir: str, make_mobile: bool) -> Dict[str, str]:
+    """Runs on a worker thread. Returns {"video", "poster", ["mobile"]} -> local output paths."""
+    outputs = {}
+
+    # Remux only (no re-encode): moves the moov atom to the front so playback can start immediately
+    faststart_path = os.path.join(output_dir, "faststart.mp4")
+    _run_ffmpeg("-i", source_path, "-map", "0", "-c", "copy", "-movflags", "+faststart", faststart_path)
+    outputs["video"] = faststart_path
+
+    poster_path = os.path.join(output_dir, "poster.jpg")
+    try:
+        _run_ffmpeg("-ss", VIDEO_POSTER_OFFSET, "-i", source_path, "-frames:v", "1", "-q:v", "3", poster_path)
+    except subprocess.CalledProcessError:
+        # Clips shorter than the offset: take the very first frame instead
+        _run_ffmpeg("-i", source_path, "-frames:v", "1", "-q:v", "3", poster_path)
+    outputs["poster"] = poster_path
+
+    if make_mobile:
+        mobile_path = os.path.join(output_dir, "mobile.mp4")
+        bitrate = f"{VIDEO_MOBILE_BITRATE_KBPS}k"
+        _run_ffmpeg(
+            "-i", source_path,
+            "-vf", f"scale=-2:'min({VIDEO_MOBILE_HEIGHT},ih)'",
+            "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+            "-b:v", bitrate, "-maxrate", bitrate, "-bufsize", f"{VIDEO_MOBILE_BITRATE_KBPS * 2}k",
+            "-c:a", "aac", "-b:a", "96k",
+            "-movflags", "+faststart",
+            mobile_path,
+        )
+        outputs["mobile"] = mobile_path
+    return outputs
+
+
+async def _download_to_file(source_url: str, path: str, request_headers: Optional[Dict[str, str]]):
+    async with httpx.AsyncClient(follow_redirects=True, timeout=60.0) as client:
+        async with client.stream("GET", source_url, headers=request_headers or {}) as response:
+            response.raise_for_status()
+            with open(path, "wb") as f:
+                async for chunk in response.aiter_bytes():
+                    f.write(chunk)
+
+
+async def postprocess_video_to_s3(
+    source_url: str,
+    bucket_name: str,
+    region: str,
+    key_prefix: str,
+    request_headers: Optional[Dict[str, str]] = None,
+    make_mobile: bool = VIDEO_MOBILE_RENDITION,
+) -> Dict[str, str]:
+    """Downloads a finished video, runs ffmpeg on it and uploads the outputs.
+
+    Returns {"video": url, "poster": url, ["mobile": url]} with immutable, long-cacheable URLs.
+    """
+    global _ffmpeg_limiter
+    s3_client = get_s3_client()
+    if not s3_client:
+        raise RuntimeError("S3 client not initialized.")
+    if _ffmpeg_limiter is None:
+        _ffmpeg_limiter = anyio.CapacityLimiter(VIDEO_POSTPROCESS_WORKERS)
+
+    with tempfile.TemporaryDirectory(prefix="video_postprocess_") as workdir:
+        extension = os.path.splitext(urllib.parse.urlparse(source_url).path)[1] or ".mp4"
+        source_path = os.path.join(workdir, f"source{extension}")
+        await _download_to_file(source_url, source_path, request_headers)
+
+        # ffmpeg does the work in its own processes; the thread only waits on them
+        outputs = await anyio.to_thread.run_sync(process_video_file, source_path, workdir, make_mobile, limiter=_ffmpeg_limiter)
+
+        urls = {}
+        for name, path in outputs.items():
+            object_name = f"{key_prefix}/{os.path.basename(path)}"
+            extra_args = {
+                "ACL": "public-read",
+                "ContentType": OUTPUT_CONTENT_TYPES.get(os.path.splitext(path)[1], "application/octet-stream"),
+                "CacheControl": ARCHIVE_CACHE_CONTROL,
+            }
+            # upload_file switches to multipart on its own for large renditions
+            await anyio.to_thread.run_sync(
+                functools.partial(s3_client.upload_file, path, bucket_name, object_name, ExtraArgs=extra_args)
+            )
+            urls[name] = public_object_url(bucket_name, region, object_name)
+
+    print(f"[VIDEO_POSTPROCESS] Processed {source_url}: {urls}")
+    return urls
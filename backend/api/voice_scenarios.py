@@ -0,0 +1,10 @@
+from typing import Dict
+
+# Scripts read in the user's cloned voice, keyed by section and scenario. Mirrors
+# IDENTITY_THEFT_VOICE_SCENARIOS in frontend/src/constants/voiceScenarios.ts; keep the two in sync.
+VOICE_SCENARIO_SCRIPTS: Dict[str, Dict[str, str]] = {
+    "IDENTITY_THEFT": {
+        "SCENARIO1": "요즘 투자 정보 하나 알아낸 게 있는데, 친구들 다 2~3배씩 수익 났다고 하더라. 내가 링크 하나 보낼 테니까 한번 들어가서 확인해봐.",
+        "SCENARIO2": "나 지금 교통사고가 났어. 보험 부르지 말고 그냥 적당히 합의보는 게 좋을 것 같아. 혹시 지금 50만 원만 보내줄 수 있을까?",
+    },
+}
@@ -0,0 +1,397 @@
+"""Replays captured production traffic against a local build and compares builds.
+
+Traces come from TrafficCaptureMiddleware (TRAFFIC_CAPTURE_ENABLED=true, download them from
+GET /api/admin/traffic-capture). Requests are sent on the original schedule, optionally sped up,
+to the app in-process; Akool, ElevenLabs, S3 and media hosts are answered by local stubs, so
+only our own code is measured. Payloads are not in the traces and are synthesized at the
+recorded sizes (identical uploads stay identical, so dedup behaves as in production).
+
+Usage (from backend/, once per build, e.g. on two checkouts):
+    python benchmarks/replay.py run traffic.jsonl --speed 4 --out before.json [--app-dir ../other-checkout/backend]
+    python benchmarks/replay.py compare before.json after.json [--threshold 20] [--min-ms 5]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+import types
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Set before the app is imported: memory state, no background S3 work, nothing captured from the replay
+REPLAY_ENVIRONMENT = {
+    "STATE_BACKEND": "memory",
+    "RESULT_ARCHIVE_ENABLED": "false",
+    "VIDEO_POSTPROCESS_ENABLED": "false",
+    "TRAFFIC_CAPTURE_ENABLED": "false",
+    "PROFILING_ENABLED": "false",
+    "AKOOL_API_KEY": "replay",
+    "ELEVEN_LABS_API_KEY": "replay",
+    "S3_BUCKET_NAME": "replay-bucket",
+    "AWS_ACCESS_KEY_ID": "replay",
+    "AWS_SECRET_ACCESS_KEY": "replay",
+    "AWS_REGION": "us-east-1",
+}
+
+# Uploads start with real magic bytes so type sniffing accepts them
+FILE_MAGIC = {
+    "image/jpeg": b"\xff\xd8\xff\xe0",
+    "image/png": b"\x89PNG\r\n\x1a\n",
+    "image/webp": b"RIFF\x00\x00\x00\x00WEBPVP8 ",
+    "audio/webm": b"\x1a\x45\xdf\xa3",
+    "audio/ogg": b"OggS",
+    "audio/mpeg": b"ID3\x04",
+}
+FILE_FIELDS = {"/api/clone-voice": "audio_file"}  # For rejected uploads, which have no recorded files; default "user_image"
+# Form values that are hashed in the trace but must be valid for the request to get anywhere
+FORM_DEFAULTS = {
+    "targets": json.dumps([
+        {"section": "FAKE_NEWS", "scenario": "SCENARIO1", "gender": "male", "mode": "image"},
+        {"section": "IDENTITY_THEFT", "scenario": "SCENARIO1", "gender": "male", "mode": "video"},
+    ]),
+}
+MEDIA_ROUTE_EXTENSIONS = {"/api/stream-video": ".mp4"}  # Other media proxies fetch images
+STUB_MEDIA_HOST = "media.replay.local"
+
+
+# --- Vendor stubs ---
+
+class StubVendors:
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    async def handle(self, request):
+        import httpx
+
+        await asyncio.sleep(self.latency)
+        path = request.url.path
+        if path.endswith("/detect"):
+            self.calls["akool_detect"] += 1
+            return httpx.Response(200, json={"error_code": 0, "landmarks_str": ["replay-landmarks"]})
+        if path.endswith(("/specifyimage", "/specifyvideo")):
+            self.calls["akool_faceswap"] += 1
+            extension = ".mp4" if path.endswith("video") else ".png"
+            return httpx.Response(200, json={"code": 1000, "msg": "ok", "data": {
+                "_id": uuid.uuid4().hex, "job_id": uuid.uuid4().hex, "url": f"https://{STUB_MEDIA_HOST}/result{extension}"
+            }})
+        if path.endswith("/listbyids"):
+            self.calls["akool_status"] += 1
+            return httpx.Response(200, json={"code": 1000, "data": {"result": [
+                {"faceswap_status": 2, "url": f"https://{STUB_MEDIA_HOST}/result.mp4"}
+            ]}})
+        self.calls["media"] += 1
+        size = int(request.url.params.get("bytes", 256 * 1024))
+        content_type = "video/mp4" if path.endswith(".mp4") else "image/png"
+        return httpx.Response(200, content=b"\0" * size, headers={"Content-Type": content_type})
+
+    def s3_client(self):
+        stub = self
+
+        class StubS3:
+            def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+                stub.calls["s3_upload"] += 1
+                time.sleep(stub.latency)
+                while fileobj.read(1024 * 1024):
+                    pass
+
+            def put_object(self, **kwargs):
+                stub.calls["s3_upload"] += 1
+                time.sleep(stub.latency)
+
+            def upload_file(self, path, bucket, key, ExtraArgs=None):
+                stub.calls["s3_upload"] += 1
+                time.sleep(stub.latency)
+
+        return StubS3()
+
+    def elevenlabs_client(self):
+        stub = self
+
+        class StubTextToSpeech:
+            def convert(self, text, **kwargs):
+                stub.calls["elevenlabs_tts"] += 1
+                time.sleep(stub.latency)
+                # Roughly the size of 128 kbps speech for this much text
+                return iter([b"\xff\xfb" + b"\0" * (len(text) * 1600)])
+
+        class StubVoices:
+            def add(self, name, files, **kwargs):
+                stub.calls["elevenlabs_clone"] += 1
+                time.sleep(stub.latency)
+                for f in files:
+                    f.read()
+                return types.SimpleNamespace(voice_id="replay-voice")
+
+        return types.SimpleNamespace(text_to_speech=StubTextToSpeech(), voices=StubVoices())
+
+
+def load_app(app_dir: str, stubs: StubVendors):
+    """Imports api.index from app_dir with every vendor call routed to the stubs."""
+    os.environ.update(REPLAY_ENVIRONMENT)
+    sys.path.insert(0, app_dir)
+    import httpx
+    import api.index as index
+
+    class StubAsyncClient(httpx.AsyncClient):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = httpx.MockTransport(stubs.handle)
+            super().__init__(*args, **kwargs)
+
+    stub_httpx = types.SimpleNamespace(**{name: getattr(httpx, name) for name in dir(httpx) if not name.startswith("_")})
+    stub_httpx.AsyncClient = StubAsyncClient
+    s3_client = stubs.s3_client()
+    elevenlabs_client = stubs.elevenlabs_client()
+    # Older builds hold the clients in module globals, newer ones create them lazily; patch whichever exists
+    for module in [module for name, module in sys.modules.items() if name == "api" or name.startswith("api.")]:
+        if hasattr(module, "httpx"):
+            module.httpx = stub_httpx
+        if hasattr(module, "get_s3_client"):
+            module.get_s3_client = lambda: s3_client
+        if hasattr(module, "s3_client"):
+            module.s3_client = s3_client
+        if hasattr(module, "get_elevenlabs_client"):
+            module.get_elevenlabs_client = lambda: elevenlabs_client
+        if hasattr(module, "elevenlabs_client"):
+            module.elevenlabs_client = elevenlabs_client
+    try:
+        import elevenlabs  # noqa: F401
+    except ImportError:
+        if hasattr(index, "elevenlabs_voice_settings"):
+            index.elevenlabs_voice_settings = lambda **settings: settings
+    return index.app
+
+
+# --- Request synthesis ---
+
+def synthetic_bytes(seed: str, size: int, prefix: bytes = b"") -> bytes:
+    """Deterministic filler: the same trace hash always produces the same content."""
+    block = hashlib.sha256(seed.encode("utf-8")).digest()
+    body = prefix + block * ((max(size - len(prefix), 0) // len(block)) + 1)
+    return body[:max(size, len(prefix))]
+
+
+def rebuild_value(shape):
+    if "value" in shape:
+        return shape["value"]
+    if "length" in shape:
+        return "가" * shape["length"]
+    if "object" in shape:
+        return {key: rebuild_value(value) for key, value in shape["object"].items()}
+    if "list" in shape:
+        return [rebuild_value(item) for item in shape["list"]]
+    return None
+
+
+def build_request(trace: dict) -> dict:
+    route = trace["route"]
+    path = route
+    for name, value in trace.get("path_params", {}).items():
+        path = path.replace("{" + name + "}", f"replay-{value}")
+
+    params = {}
+    for name, shape in trace.get("query", {}).items():
+        if name == "url":
+            extension = MEDIA_ROUTE_EXTENSIONS.get(route, ".png")
+            size = trace["response"].get("size") or 256 * 1024
+            params[name] = f"https://{STUB_MEDIA_HOST}/{shape.get('hash', 'media')}{extension}?bytes={size}"
+        else:
+            params[name] = rebuild_value(shape)
+
+    client_hash = trace.get("client") or "0"
+    # One fake IP per captured client, so per-client rate limits apply as they did in production
+    client_ip = ".".join(str(b) for b in hashlib.sha256(client_hash.encode()).digest()[:4])
+    headers = {"X-Forwarded-For": client_ip}
+    if trace.get("accept"):
+        headers["Accept"] = trace["accept"]
+
+    request = {"method": trace["method"], "url": path, "params": params, "headers": headers}
+    body = trace.get("request") or {}
+    if body.get("uploads") or body.get("content_type") == "multipart/form-data":
+        uploads = body.get("uploads") or {
+            FILE_FIELDS.get(route, "user_image"): {"hash": body.get("hash", ""), "size": body.get("size", 0), "content_type": "image/png"}
+        }
+        request["files"] = {
+            field: (
+                f"replay{upload['hash'][:8]}",
+                synthetic_bytes(upload["hash"], upload["size"], FILE_MAGIC.get(upload["content_type"], b"")),
+                upload["content_type"],
+            )
+            for field, upload in uploads.items()
+        }
+        request["data"] = {
+            key: FORM_DEFAULTS.get(key, rebuild_value(shape)) if "value" not in shape else shape["value"]
+            for key, shape in (body.get("form") or {}).items()
+        }
+    elif body.get("json") is not None:
+        request["json"] = rebuild_value(body["json"])
+    elif body.get("size"):
+        request["content"] = synthetic_bytes(body.get("hash", ""), body["size"])
+        headers["Content-Type"] = body.get("content_type") or "application/octet-stream"
+    return request
+
+
+# --- Replay ---
+
+def load_traces(path: str, limit: Optional[int]) -> List[dict]:
+    with open(path) as f:
+        traces = [json.loads(line) for line in f if line.strip()]
+    traces.sort(key=lambda trace: trace["ts"])
+    return traces[:limit] if limit else traces
+
+
+async def replay(app, traces: List[dict], speed: float, timeout: float) -> List[dict]:
+    import httpx
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay.local", timeout=timeout) as client:
+        first_ts = traces[0]["ts"]
+        started = time.perf_counter()
+
+        async def send(trace: dict):
+            # Open loop: requests go out on the recorded schedule whether or not earlier ones finished
+            delay = (trace["ts"] - first_ts) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            request = build_request(trace)
+            start = time.perf_counter()
+            try:
+                response = await client.request(**request)
+                status, size = response.status_code, len(response.content)
+            except Exception as e:
+                status, size = None, 0
+                print(f"{trace['method']} {trace['route']} failed: {e}")
+            results.append({
+                "key": f"{trace['method']} {trace['route']}",
+                "status": status,
+                "expected_status": trace["response"].get("status"),
+                "latency_ms": (time.perf_counter() - start) * 1000,
+                "size": size,
+            })
+
+        await asyncio.gather(*(send(trace) for trace in traces))
+    return results
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(results: List[dict]) -> Dict[str, dict]:
+    by_route: Dict[str, List[dict]] = defaultdict(list)
+    for result in results:
+        by_route[result["key"]].append(result)
+    summary = {}
+    for key, route_results in sorted(by_route.items()):
+        latencies = [result["latency_ms"] for result in route_results]
+        summary[key] = {
+            "count": len(route_results),
+            "errors": sum(1 for result in route_results if result["status"] is None or result["status"] >= 500),
+            "status_mismatches": sum(1 for result in route_results if result["status"] != result["expected_status"]),
+            "p50_ms": round(statistics.median(latencies), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "max_ms": round(max(latencies), 1),
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, dict]):
+    print(f"{'route':<48}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for key, stats in summary.items():
+        print(f"{key:<48}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+
+def run_command(args):
+    traces = load_traces(args.traces, args.limit)
+    if not traces:
+        raise SystemExit(f"No traces in {args.traces}")
+    stubs = StubVendors(args.vendor_latency_ms)
+    app = load_app(os.path.abspath(args.app_dir), stubs)
+
+    span = traces[-1]["ts"] - traces[0]["ts"]
+    print(f"Replaying {len(traces)} requests spanning {span:.0f}s at {args.speed}x (~{span / args.speed:.0f}s)")
+    started = time.perf_counter()
+    results = asyncio.run(replay(app, traces, args.speed, args.timeout))
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(results)
+    print_summary(summary)
+    print(f"\nWall time {elapsed:.1f}s; stubbed vendor calls: {dict(stubs.calls)}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "app_dir": os.path.abspath(args.app_dir),
+                "traces": args.traces,
+                "speed": args.speed,
+                "vendor_latency_ms": args.vendor_latency_ms,
+                "routes": summary,
+            }, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+def compare_command(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["routes"]
+    with open(args.candidate) as f:
+        candidate = json.load(f)["routes"]
+
+    regressions = []
+    print(f"{'route':<48}{'p50 ms':>19}{'p95 ms':>19}{'change':>9}")
+    for key in sorted(set(baseline) & set(candidate)):
+        before, after = baseline[key], candidate[key]
+        change = (after["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        regressed = change > args.threshold and after["p95_ms"] - before["p95_ms"] > args.min_ms
+        more_errors = after["errors"] > before["errors"]
+        if regressed or more_errors:
+            regressions.append(key)
+        marker = "  <-- regression" if regressed else ("  <-- more errors" if more_errors else "")
+        print(
+            f"{key:<48}{before['p50_ms']:>8.1f} -> {after['p50_ms']:<7.1f}{before['p95_ms']:>8.1f} -> {after['p95_ms']:<7.1f}"
+            f"{change:>+8.1f}%{marker}"
+        )
+    for key in sorted(set(baseline) ^ set(candidate)):
+        print(f"{key:<48}only in {'baseline' if key in baseline else 'candidate'}")
+
+    if regressions:
+        print(f"\n{len(regressions)} route(s) regressed (p95 > +{args.threshold:.0f}% and > +{args.min_ms:.0f} ms, or more errors)")
+        sys.exit(1)
+    print("\nNo latency regressions.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Replay traces against a build")
+    run.add_argument("traces", help="JSON lines file from the traffic capture")
+    run.add_argument("--speed", type=float, default=1.0, help="Replay N times faster than recorded")
+    run.add_argument("--app-dir", default=BACKEND_DIR, help="backend/ directory of the build to test")
+    run.add_argument("--vendor-latency-ms", type=float, default=0.0, help="Delay added by every stubbed vendor call")
+    run.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    run.add_argument("--limit", type=int, help="Only replay the first N requests")
+    run.add_argument("--out", help="Write the per-route summary here for `compare`")
+    run.set_defaults(func=run_command)
+
+    compare = commands.add_parser("compare", help="Report latency regressions between two runs")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--threshold", type=float, default=20.0, help="Allowed p95 increase in percent")
+    compare.add_argument("--min-ms", type=float, default=5.0, help="Ignore p95 increases smaller than this")
+    compare.set_defaults(func=compare_command)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Cold-start benchmark for the backend function.
+
+Imports api.index in fresh interpreters with `-X importtime` and breaks the import
+cost down per top-level module, then measures lazy vendor client construction.
+
+Usage (from backend/):
+    python benchmarks/startup_time.py [--runs 5] [--top 15] [--with-clients]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# api.index prints config warnings on import, so the report line carries a marker
+CLIENT_TIMING_MARKER = "CLIENT_TIMING "
+CLIENT_TIMING_SNIPPET = (
+    "import json, time; t = time.perf_counter(); import api.index; "
+    "imported = (time.perf_counter() - t) * 1000; "
+    "from api.clients import warm_up_clients; "
+    f"print({CLIENT_TIMING_MARKER!r} + json.dumps({{'import_ms': imported, 'clients': warm_up_clients()}}))"
+)
+
+
+def parse_importtime(stderr: str) -> Tuple[Dict[str, int], int]:
+    """Returns (self time in us per top-level package, total cumulative us of api.index)."""
+    per_package: Dict[str, int] = defaultdict(int)
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            fields = line[len("import time:"):].split("|")
+            self_us, cumulative_us, name = int(fields[0]), int(fields[1]), fields[2]
+        except (ValueError, IndexError):
+            continue
+        module = name.strip()
+        per_package[module.split(".")[0]] += self_us
+        if module == "api.index":
+            total_us = cumulative_us
+    return per_package, total_us
+
+
+def run_once(with_clients: bool) -> Tuple[Dict[str, int], int, Optional[str]]:
+    code = CLIENT_TIMING_SNIPPET if with_clients else "import api.index"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        tail = "\n".join(line for line in result.stderr.splitlines() if not line.startswith("import time:"))
+        raise SystemExit(f"Importing api.index failed:\n{tail}")
+    per_package, total_us = parse_importtime(result.stderr)
+    client_report = None
+    if with_clients:
+        for line in result.stdout.splitlines():
+            if line.startswith(CLIENT_TIMING_MARKER):
+                client_report = line[len(CLIENT_TIMING_MARKER):]
+    return per_package, total_us, client_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreter runs (median is reported)")
+    parser.add_argument("--top", type=int, default=15, help="How many modules to list")
+    parser.add_argument("--with-clients", action="store_true", help="Also time S3/ElevenLabs client construction")
+    args = parser.parse_args()
+
+    samples: Dict[str, List[int]] = defaultdict(list)
+    totals: List[int] = []
+    client_reports: List[str] = []
+    for _ in range(args.runs):
+        per_package, total_us, client_report = run_once(args.with_clients)
+        totals.append(total_us)
+        for package, us in per_package.items():
+            samples[package].append(us)
+        if client_report:
+            client_reports.append(client_report)
+
+    medians = {package: statistics.median(values + [0] * (args.runs - len(values))) for package, values in samples.items()}
+    total_ms = statistics.median(totals) / 1000
+
+    print(f"api.index import: {total_ms:.1f} ms (median of {args.runs} cold runs)")
+    print(f"{'module':<30}{'self ms':>10}{'share':>9}")
+    for package, us in sorted(medians.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        share = us / 1000 / total_ms * 100 if total_ms else 0
+        print(f"{package:<30}{us / 1000:>10.1f}{share:>8.1f}%")
+
+    if client_reports:
+        print("\nLazy client construction (last run):")
+        print(client_reports[-1])
+
+
+if __name__ == "__main__":
+    main()
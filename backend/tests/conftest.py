@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Lets the tests import the backend as the deployed function does ("api.state", "api.index", ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
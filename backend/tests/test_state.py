@@ -0,0 +1,162 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+
+import pytest
+
+from api import state as state_module
+from api.state import MemoryStateBackend, RedisStateBackend, SQLiteStateBackend, _PrefixedStateBackend
+
+# Set TEST_REDIS_URL to run the redis cases against a real server (e.g. a local redis-server or
+# valkey-server); otherwise they use fakeredis' TCP server as a Redis-protocol stand-in.
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    if TEST_REDIS_URL:
+        yield TEST_REDIS_URL
+        return
+    # Pinned in requirements-dev.txt; fail rather than skip so the redis cases can't silently drop out
+    import fakeredis
+
+    class StandInServer(fakeredis.TcpFakeServer):
+        # socketserver's default listen backlog of 5 resets the concurrent test connections
+        request_queue_size = 128
+
+    port = _free_port()
+    server = StandInServer(("127.0.0.1", port), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"redis://127.0.0.1:{port}/0"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def make_state(request, tmp_path):
+    """Returns a factory, so each backend is created inside the event loop of the test that uses it."""
+    if request.param == "memory":
+        return lambda: _PrefixedStateBackend(MemoryStateBackend(), "test:")
+    if request.param == "sqlite":
+        path = str(tmp_path / "state.db")
+        return lambda: _PrefixedStateBackend(SQLiteStateBackend(path), "test:")
+    url = request.getfixturevalue("redis_url")
+    # A fresh prefix per test keeps runs against a shared server independent
+    prefix = f"test:{uuid.uuid4().hex}:"
+    return lambda: _PrefixedStateBackend(RedisStateBackend(url), prefix)
+
+
+def run_with_state(make_state, scenario):
+    async def main():
+        state = make_state()
+        try:
+            await scenario(state)
+        finally:
+            await state.close()
+    asyncio.run(main())
+
+
+def test_get_set_with_ttl(make_state):
+    async def scenario(state):
+        assert await state.get("missing") is None
+        await state.set("plain", "value")
+        await state.set("expiring", "value", ttl=0.2)
+        assert await state.get("plain") == "value"
+        assert await state.get("expiring") == "value"
+        await asyncio.sleep(0.4)
+        assert await state.get("plain") == "value"
+        assert await state.get("expiring") is None
+
+        await state.set_json("json", {"task_id": "abc", "faceswap_status": 2})
+        assert await state.get_json("json") == {"task_id": "abc", "faceswap_status": 2}
+        await state.delete("json")
+        assert await state.get_json("json") is None
+    run_with_state(make_state, scenario)
+
+
+def test_set_if_absent(make_state):
+    async def scenario(state):
+        assert await state.set_if_absent("claim", "first", ttl=0.2)
+        assert not await state.set_if_absent("claim", "second", ttl=0.2)
+        assert await state.get("claim") == "first"
+        await asyncio.sleep(0.4)
+        # An expired claim can be taken again
+        assert await state.set_if_absent("claim", "third")
+        assert await state.get("claim") == "third"
+    run_with_state(make_state, scenario)
+
+
+def test_set_if_absent_has_one_winner(make_state):
+    async def scenario(state):
+        results = await asyncio.gather(*[state.set_if_absent("race", str(i), ttl=5) for i in range(10)])
+        assert results.count(True) == 1
+    run_with_state(make_state, scenario)
+
+
+def test_incr(make_state):
+    async def scenario(state):
+        assert await state.incr("counter", ttl=0.3) == 1
+        assert await state.incr("counter", 2, ttl=0.3) == 3
+        assert await state.get("counter") == "3"
+        # The TTL starts with the first increment and isn't extended by later ones
+        await asyncio.sleep(0.5)
+        assert await state.get("counter") is None
+        assert await state.incr("counter") == 1
+
+        counts = await asyncio.gather(*[state.incr("concurrent") for _ in range(20)])
+        assert sorted(counts) == list(range(1, 21))
+    run_with_state(make_state, scenario)
+
+
+def test_publish_subscribe(make_state):
+    async def scenario(state):
+        messages = state.subscribe("akool_task:abc")
+        received = asyncio.ensure_future(messages.__anext__())
+        try:
+            # The subscription starts when the iterator first runs; publish until it has
+            deadline = time.monotonic() + 5
+            while not received.done() and time.monotonic() < deadline:
+                await state.publish("akool_task:other", "ignored")
+                await state.publish("akool_task:abc", "hello")
+                await asyncio.wait({received}, timeout=0.1)
+            assert received.done(), "no message received"
+            assert received.result() == "hello"
+        finally:
+            if not received.done():
+                received.cancel()
+                await asyncio.gather(received, return_exceptions=True)
+            await messages.aclose()
+    run_with_state(make_state, scenario)
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_expired_keys_are_purged_on_write(backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(state_module, "EXPIRED_SWEEP_INTERVAL", 0)
+    if backend == "memory":
+        state = MemoryStateBackend()
+        stored_keys = lambda: set(state._data)
+    else:
+        state = SQLiteStateBackend(str(tmp_path / "state.db"))
+        stored_keys = lambda: {row[0] for row in state._conn().execute("SELECT key FROM kv")}
+
+    async def scenario():
+        # Like rate-limit windows: written once, never read again
+        await state.incr("ratelimit:client:1", ttl=0.1)
+        await state.set("rendition", "audio", ttl=0.1)
+        await asyncio.sleep(0.3)
+        await state.incr("ratelimit:client:2", ttl=60)
+        assert stored_keys() == {"ratelimit:client:2"}
+        await state.close()
+    asyncio.run(scenario())
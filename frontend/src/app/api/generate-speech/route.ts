@@ -1,7 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server';
 
 export async function POST(req: NextRequest) {
-  const body = await req.json(); // Expected: { text?: string, name?: string, age?: string, voice_id?: string }
+  const body = await req.json(); // Expected: { text?: string, name?: string, age?: string, voice_id?: string, session_id?: string }
 
   // Determine the Python backend URL
   // For local development, this might be http://localhost:8000
@@ -6,6 +6,7 @@ import { VIDEO_URLS } from '@/constants/videos';
 import { commonStyles } from '@/styles/common';
 import PageLayout from '@/components/layouts/PageLayout';
 import MinaAudioPlayer from '@/components/MinaAudioPlayer';
+import { resolveFaceswapTaskId } from '@/utils/faceswapJob';
 import GeneratedImageDisplay from '@/components/GeneratedImageDisplay';
 
 type Section = 'concept' | 'cases' | 'scenarios';
@@ -66,6 +67,7 @@ export default function Part1Page() {
   const [scenarioStep, setScenarioStep] = useState<'intro' | 'description' | 'video' | 'conclusion'>('intro');
   const [imageUploaded, setImageUploaded] = useState(false);
   const [uploadedImage, setUploadedImage] = useState<File | null>(null);
+  const [generatedImageUrl, setGeneratedImageUrl] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
@@ -126,7 +128,7 @@ export default function Part1Page() {
       }
       
       const data = await initiateResponse.json();
-      const taskId = data.akool_task_id;
+      const taskId = await resolveFaceswapTaskId(data);
       
       if (!taskId) {
         throw new Error('작업 ID를 받지 못했습니다.');
@@ -149,18 +151,14 @@ export default function Part1Page() {
           console.log('Faceswap status:', statusData);
           
           if (statusData.status_details?.faceswap_status === 2) {
-            // Success! Move to description step
+            // Success! Prefer the stable archived URL over Akool's expiring one
+            const imageUrl = statusData.result_url || statusData.status_details?.url;
+            console.log('Generated image URL:', imageUrl);
+            setGeneratedImageUrl(imageUrl || null);
             setScenarioStep('description');
             setIsLoading(false);
             return;
           } else if (statusData.status_details?.faceswap_status === 3) {
-            // Check if we have a URL in the response
-            const imageUrl = statusData.status_details?.url;
-            if (imageUrl) {
-              console.log('Generated image URL:', imageUrl);
-              router.push(`/generated-image?url=${encodeURIComponent(imageUrl)}&fromScenario=${currentScenario}`);
-              return;
-            }
             throw new Error(statusData.status_details?.msg || '이미지 생성 중 오류가 발생했습니다.');
           }
           
@@ -330,7 +328,7 @@ export default function Part1Page() {
           <div className="flex flex-col items-center space-y-4">
             {showVideo ? (
               <GeneratedImageDisplay
-                imageUrl={`/api/faceswap?scenario=FAKE_NEWS/SCENARIO${currentScenario}`}
+                imageUrl={generatedImageUrl || `/api/faceswap?scenario=FAKE_NEWS/SCENARIO${currentScenario}`}
                 onVideoEnd={() => {
                   setShowVideo(false);
                   setScenarioStep('conclusion');
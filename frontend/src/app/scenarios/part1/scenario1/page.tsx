@@ -4,6 +4,8 @@ import React, { useState } from 'react';
 import { useRouter } from 'next/navigation';
 import ImageUpload from '@/components/ImageUpload';
 import MinaAudioPlayer from '@/components/MinaAudioPlayer';
+import { resolveFaceswapTaskId } from '@/utils/faceswapJob';
+import GeneratedImageDisplay from '@/components/GeneratedImageDisplay';
 import { VIDEO_URLS } from '@/constants/videos';
 
 const SCENARIO1_SCRIPTS = {
@@ -29,6 +31,7 @@ export default function Scenario1Page() {
   const [gender, setGender] = useState<'male' | 'female'>('male');
   const [currentStep, setCurrentStep] = useState<'intro' | 'upload' | 'description' | 'video' | 'conclusion'>('intro');
   const [showVideo, setShowVideo] = useState(false);
+  const [generatedImageUrl, setGeneratedImageUrl] = useState<string | null>(null);
 
   const handleImageUpload = async (file: File) => {
     try {
@@ -56,7 +59,7 @@ export default function Scenario1Page() {
       }
 
       const data = await response.json();
-      const taskId = data.akool_task_id;
+      const taskId = await resolveFaceswapTaskId(data);
 
       if (!taskId) {
         console.error('No task_id received from backend:', data);
@@ -81,12 +84,14 @@ export default function Scenario1Page() {
           if (statusData.status_details && statusData.status_details.faceswap_status === 2) {
             clearInterval(pollInterval);
             pollingCompleted = true;
-            const imageUrl = statusData.status_details.url;
+            // Prefer the stable archived URL over Akool's expiring one
+            const imageUrl = statusData.result_url || statusData.status_details.url;
             if (!imageUrl) {
               setError('생성된 이미지 URL을 받지 못했습니다.');
               setIsProcessing(false);
               return;
             }
+            setGeneratedImageUrl(imageUrl);
             // Store the original uploaded image data in localStorage
             const reader = new FileReader();
             reader.onloadend = () => {
@@ -155,6 +160,7 @@ export default function Scenario1Page() {
       case 'video':
         return (
           <div className="flex flex-col items-center space-y-4">
+            {generatedImageUrl && <GeneratedImageDisplay imageUrl={generatedImageUrl} />}
             {showVideo ? (
               <div className="aspect-video w-full">
                 <video 
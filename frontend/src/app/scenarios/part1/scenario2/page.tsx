@@ -4,6 +4,8 @@ import React, { useState, useEffect } from 'react';
 import { useRouter } from 'next/navigation';
 import ImageUpload from '@/components/ImageUpload';
 import MinaAudioPlayer from '@/components/MinaAudioPlayer';
+import { resolveFaceswapTaskId } from '@/utils/faceswapJob';
+import GeneratedImageDisplay from '@/components/GeneratedImageDisplay';
 import { VIDEO_URLS } from '@/constants/videos';
 
 const SCENARIO2_SCRIPTS = {
@@ -25,6 +27,7 @@ export default function Part1Scenario2Page() {
   const [gender, setGender] = useState<'male' | 'female'>('male');
   const [currentStep, setCurrentStep] = useState<'intro' | 'video' | 'conclusion'>('intro');
   const [showVideo, setShowVideo] = useState(false);
+  const [generatedImageUrl, setGeneratedImageUrl] = useState<string | null>(null);
   const [userImageFile, setUserImageFile] = useState<File | null>(null);
   const [userImagePreviewUrl, setUserImagePreviewUrl] = useState<string | null>(null);
 
@@ -71,7 +74,7 @@ export default function Part1Scenario2Page() {
       }
 
       const data = await response.json();
-      const taskId = data.akool_task_id;
+      const taskId = await resolveFaceswapTaskId(data);
 
       if (!taskId) {
         console.error('No task_id received from backend for Scenario 2:', data);
@@ -96,12 +99,14 @@ export default function Part1Scenario2Page() {
           if (statusData.status_details && statusData.status_details.faceswap_status === 2) {
             clearInterval(pollInterval);
             pollingCompleted = true;
-            const imageUrl = statusData.status_details.url;
+            // Prefer the stable archived URL over Akool's expiring one
+            const imageUrl = statusData.result_url || statusData.status_details.url;
             if (!imageUrl) {
               setError('생성된 이미지 URL을 받지 못했습니다 (시나리오 2).');
               setIsProcessing(false);
               return;
             }
+            setGeneratedImageUrl(imageUrl);
             setCurrentStep('video');
             setIsProcessing(false);
           } else if (statusData.status_details && statusData.status_details.faceswap_status === 3) {
@@ -146,6 +151,7 @@ export default function Part1Scenario2Page() {
       case 'video':
         return (
           <div className="flex flex-col items-center space-y-4">
+            {generatedImageUrl && <GeneratedImageDisplay imageUrl={generatedImageUrl} />}
             {showVideo ? (
               <div className="aspect-video w-full">
                 <video 
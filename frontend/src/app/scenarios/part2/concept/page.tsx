@@ -5,6 +5,7 @@ import { useRouter, useSearchParams } from 'next/navigation';
 import { VIDEO_URLS } from '@/constants/videos';
 import { MINA_DIALOGUE, SCRIPT_KEY_MAP } from '@/constants/minaScripts';
 import MinaDialogue from '@/components/MinaDialogue';
+import { getSpeechSessionId } from '@/utils/speechPrefetch';
 
 const identityTheftCaseStudies = [
   {
@@ -40,7 +41,7 @@ export default function Part2ConceptPage() {
       const response = await fetch('/api/generate-speech', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ text }),
+        body: JSON.stringify({ text, session_id: getSpeechSessionId() }),
       });
       if (!response.ok) throw new Error('Failed to fetch audio for Part 2 Concept');
       const blob = await response.blob();
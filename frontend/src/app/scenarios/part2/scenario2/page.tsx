@@ -39,7 +39,8 @@ export default function Part2Scenario2Page() {
         body: JSON.stringify({
           text: IDENTITY_THEFT_VOICE_SCENARIOS.SCENARIO2.script,
           voice_id: clonedVoiceId,
-          model_id: "eleven_multilingual_v2"
+          model_id: "eleven_multilingual_v2",
+          chunked: true
         })
       });
 
@@ -5,6 +5,7 @@ import { useRouter } from 'next/navigation';
 import { VIDEO_URLS } from '@/constants/videos';
 import { commonStyles } from '@/styles/common';
 import PageLayout from '@/components/layouts/PageLayout';
+import { resolveFaceswapTaskId } from '@/utils/faceswapJob';
 import ImageUpload from '@/components/ImageUpload';
 
 export default function Part2Scenario3Page() {
@@ -83,7 +84,10 @@ export default function Part2Scenario3Page() {
       }
 
       const data = await response.json();
-      const taskId = data.akool_task_id;
+      const taskId = await resolveFaceswapTaskId(data);
+      if (!taskId) {
+        throw new Error('작업 ID를 받지 못했습니다.');
+      }
       setStatusMessage('작업 ID 확인됨, 결과 폴링 중...');
 
       // Polling loop
@@ -99,11 +103,14 @@ export default function Part2Scenario3Page() {
         console.log('=====================');
         
         if (statusData.status_details.faceswap_status === 2) { // Success
-          const originalGeneratedUrl = statusData.status_details.url;
+          // Prefer the stable archived result; Akool's own URL needs the stream-video proxy
+          const originalGeneratedUrl = statusData.result_url || statusData.status_details.url;
           if (originalGeneratedUrl) {
             console.log('SUCCESS: Original generated video URL received:', originalGeneratedUrl);
             console.log('Setting localStorage with key "generatedVideoToPlay"');
             localStorage.setItem('generatedVideoToPlay', originalGeneratedUrl);
+            // Lets the player pick up the faststart video and poster from /api/faceswap-video-assets
+            localStorage.setItem('generatedVideoTaskId', taskId);
             
             // Verify localStorage was set
             const storedUrl = localStorage.getItem('generatedVideoToPlay');
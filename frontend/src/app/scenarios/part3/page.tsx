@@ -6,6 +6,7 @@ import PageLayout from '@/components/layouts/PageLayout';
 import { commonStyles } from '@/styles/common';
 import { part3Scripts, TALKING_GIF_SRC, MINA_IDLE_PNG_SRC } from '@/constants/part3Content';
 import Image from 'next/image';
+import { endSpeechPrefetch } from '@/utils/speechPrefetch';
 
 export default function Part3Page() {
   const router = useRouter();
@@ -46,6 +47,7 @@ export default function Part3Page() {
     setError(null);
     
     if (showThankYouMessage) {
+      endSpeechPrefetch();
       router.push('/completion');
       return;
     }
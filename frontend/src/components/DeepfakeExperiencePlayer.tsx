@@ -3,6 +3,7 @@ import { useState, useRef, useEffect } from 'react'
 
 interface DeepfakeExperiencePlayerProps {
   videoUrl: string | null;
+  posterUrl?: string | null; // Poster frame from /api/faceswap-video-assets, shown until playback starts
   // introAudioUrl?: string | null; // Removed for simplification in this step
   isLoading: boolean; // isLoading from parent (e.g. if page.tsx determines overall loading state)
   error: string | null; // error from parent
@@ -12,6 +13,7 @@ interface DeepfakeExperiencePlayerProps {
 
 export default function DeepfakeExperiencePlayer({
   videoUrl,
+  posterUrl,
   // introAudioUrl, // Removed
   isLoading: parentIsLoading,
   error: parentError,
@@ -112,6 +114,7 @@ export default function DeepfakeExperiencePlayer({
             controls
             autoPlay
             preload="auto"
+            poster={posterUrl ?? undefined}
             onLoadedData={handleLoadedData}
             onCanPlay={handleCanPlay}
             onError={handleVideoError}
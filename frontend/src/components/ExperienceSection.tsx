@@ -13,7 +13,7 @@ interface ExperienceSectionProps {
   onVoiceRecording: (audioBlob: Blob) => void;
   isProcessing: boolean;
   processingMessage: string;
-  generatedVideoUrl: string | null;
+  generatedVideoUrl: string | null; // Pass the status response's result_url when it has one
   userScriptAudioUrl: string | null;
   error: string | null;
   onNext: () => void;
@@ -50,7 +50,7 @@ const ExperienceSection: React.FC<ExperienceSectionProps> = ({
   const fetchImageAsBlob = async (url: string) => {
     try {
       console.log('Fetching image as blob:', url);
-      const proxyUrl = `/api/proxy-image?url=${encodeURIComponent(url)}`;
+      const proxyUrl = getProxyImageUrl(url);
       console.log('Using proxy URL:', proxyUrl);
       
       const response = await fetch(proxyUrl, {
@@ -107,8 +107,11 @@ const ExperienceSection: React.FC<ExperienceSectionProps> = ({
     if (!url) return '';
     
     console.log('getProxyImageUrl input:', url);
-    
-    // For all URLs, use the proxy
+
+    // Our own URLs (e.g. /api/faceswap-result/...) are served directly
+    if (url.startsWith('/api/')) return url;
+
+    // External URLs go through the proxy
     const proxyUrl = `/api/proxy-image?url=${encodeURIComponent(url)}`;
     console.log('Using proxy URL:', proxyUrl);
     return proxyUrl;
@@ -19,6 +19,12 @@ const GeneratedImageDisplay: React.FC<GeneratedImageDisplayProps> = ({ imageUrl,
         setError(null);
         console.log('Fetching image from:', imageUrl);
 
+        // Archived results: the <img> follows the cacheable redirect to the stable copy itself
+        if (imageUrl.startsWith('/api/faceswap-result/')) {
+          setImageSrc(imageUrl);
+          return;
+        }
+
         // If the URL starts with /api/, fetch it directly
         if (imageUrl.startsWith('/api/')) {
           const response = await fetch(imageUrl, {
@@ -1,5 +1,6 @@
 'use client'
 import { useState } from 'react'
+import { startSpeechPrefetch } from '@/utils/speechPrefetch'
 
 interface UserInfo {
   name: string
@@ -20,6 +21,8 @@ export default function UserInfoForm({ onSubmit }: UserInfoFormProps) {
 
   const handleSubmit = (e: React.FormEvent) => {
     e.preventDefault()
+    // Not awaited: the narrator lines render in the background while the user moves on
+    startSpeechPrefetch(userInfo.name, userInfo.age)
     onSubmit(userInfo)
   }
 
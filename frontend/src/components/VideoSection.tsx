@@ -2,6 +2,7 @@ import React, { useState, useRef, useEffect } from 'react';
 import { commonStyles } from '@/styles/common';
 import MinaDialogue from './MinaDialogue';
 import { MinaScript } from '@/constants/minaScripts';
+import { getSpeechSessionId } from '@/utils/speechPrefetch';
 
 interface VideoSectionProps {
   videos: string[];
@@ -42,7 +43,8 @@ export default function VideoSection({
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ 
           text,
-          model_id: "eleven_multilingual_v2"
+          model_id: "eleven_multilingual_v2",
+          session_id: getSpeechSessionId()
         }),
       });
       if (!response.ok) throw new Error('Failed to fetch audio');
@@ -0,0 +1,18 @@
+/**
+ * Returns the Akool task ID from an initiate-faceswap response. A 202 response carries a job_id
+ * instead: the submission outlasted the server's time budget and continues as a background job,
+ * which is polled here until it has a task ID.
+ */
+export async function resolveFaceswapTaskId(data: { akool_task_id?: string; job_id?: string }): Promise<string | undefined> {
+  let taskId = data.akool_task_id;
+  while (!taskId && data.job_id) {
+    await new Promise(resolve => setTimeout(resolve, 2000));
+    const jobResponse = await fetch(`/api/faceswap-job/${data.job_id}`);
+    const jobData = await jobResponse.json();
+    if (jobData.status === 'failed') {
+      throw new Error(jobData.error || '얼굴 교체 요청 실패');
+    }
+    taskId = jobData.akool_task_id;
+  }
+  return taskId;
+}
@@ -0,0 +1,47 @@
+import { MINA_DIALOGUE, SCRIPT_KEY_MAP } from '@/constants/minaScripts';
+
+const SESSION_STORAGE_KEY = 'speechPrefetchSessionId';
+
+// Narrator lines of the Part 2 concept page, in the order they are spoken. Conditional
+// lines (quiz feedback) are left out; the backend caps how many can be prefetched.
+const PREFETCH_SCRIPT_KEYS = [
+  SCRIPT_KEY_MAP.GREETING_P2,
+  SCRIPT_KEY_MAP.COMPREHENSION_QUESTION_P2,
+  SCRIPT_KEY_MAP.CASE_STUDY_INTRO_P2,
+  SCRIPT_KEY_MAP.VOICE_PHISHING_CASE,
+  SCRIPT_KEY_MAP.FAMOUS_VOICE_CASE,
+  SCRIPT_KEY_MAP.SCENARIOS_INTRO_P2,
+];
+
+/** Asks the backend to synthesize the upcoming narrator lines; speech requests then pass getSpeechSessionId(). */
+export async function startSpeechPrefetch(name: string, age: string): Promise<void> {
+  const scripts = PREFETCH_SCRIPT_KEYS
+    .filter((key) => MINA_DIALOGUE[key])
+    .map((key) => ({ script_id: key, text: MINA_DIALOGUE[key].text }));
+  try {
+    const response = await fetch('/api/prefetch-speech', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ session_id: getSpeechSessionId(), name, age, scripts }),
+    });
+    if (!response.ok) throw new Error(`Prefetch request failed (${response.status})`);
+    const data = await response.json();
+    localStorage.setItem(SESSION_STORAGE_KEY, data.session_id);
+  } catch (error) {
+    // Speech still works without a prefetch, it is just synthesized on demand
+    console.warn('Speech prefetch unavailable:', error);
+  }
+}
+
+export function getSpeechSessionId(): string | undefined {
+  return localStorage.getItem(SESSION_STORAGE_KEY) ?? undefined;
+}
+
+/** Drops prefetched audio that was never played; call when the experience ends. */
+export function endSpeechPrefetch(): void {
+  const sessionId = getSpeechSessionId();
+  if (!sessionId) return;
+  localStorage.removeItem(SESSION_STORAGE_KEY);
+  fetch(`/api/prefetch-speech/${sessionId}`, { method: 'DELETE', keepalive: true })
+    .catch((error) => console.warn('Could not end speech prefetch session:', error));
+}